@@ -6,8 +6,26 @@ augment the test suite with your own test cases to further test your code.
 You must test your agent's strength against a set of agents with known
 relative strength using tournament.py and include the results in your report.
 """
+import functools
 import random
 
+from isolation import Deadline
+from isolation import distinct_moves
+from isolation.endgame import Unsolved, partition_utility, solve
+# the opening book builder plays games with CustomPlayer, so the module is
+# imported as a whole to allow either module to be imported first
+from opening_book import load_book
+from parallel_search import PonderSearch
+from parallel_search import SearchPool
+from tablebase import load_tablebase
+from transposition import TranspositionTable, EXACT, LOWER, UPPER, MOVE
+from transposition import SharedTranspositionTable
+
+
+# Mixed into the transposition table keys of the positions searched by the
+# second player (see `CustomPlayer.seat_key()`)
+SEAT_KEY = 0x5bd1e9955bd1e995
+
 
 class Timeout(Exception):
     pass
@@ -33,17 +51,45 @@ def custom_score(game, player):
     float
         The heuristic value of the current game state to the specified player.
     """
-    if game.is_loser(player):
-        return float("-inf")
+    own_moves, opp_moves, utility = game.mobility(player)
+    if utility:
+        return utility
+
+    return float(own_moves - (2 * opp_moves))
+
+
+def endgame_score(game, player, memo=None):
+    """Calculate the heuristic value of a game state like `custom_score()`,
+    except that the exact value (+inf or -inf) is returned when the players
+    are partitioned into small enough regions of the board for the endgame
+    to be solved (see `isolation.endgame.partition_utility()`).
+
+    `CustomPlayer` passes a `memo` of the longest paths solved during the
+    current move, so that the leaves of a search share their solutions.
+    """
+    own_moves, opp_moves, utility = game.mobility(player)
+    if utility:
+        return utility
 
-    if game.is_winner(player):
-        return float("inf")
+    utility = partition_utility(game, player, memo=memo)
+    if utility is not None:
+        return utility
 
-    own_moves = len(game.get_legal_moves(player))
-    opp_moves = len(game.get_legal_moves(game.get_opponent(player)))
     return float(own_moves - (2 * opp_moves))
 
 
+def hash_move_first(moves, hash_move):
+    """Return the list of moves reordered so that the best move stored in the
+    transposition table for the position is searched first.
+    """
+    if hash_move is None or hash_move not in moves or moves[0] == hash_move:
+        return moves
+    moves = moves[:]
+    moves.remove(hash_move)
+    moves.insert(0, hash_move)
+    return moves
+
+
 class CustomPlayer:
     """Game-playing agent that chooses a move using the evaluation function (custom_score)
     and a depth-limited minimax algorithm with alpha-beta pruning.
@@ -70,15 +116,165 @@ class CustomPlayer:
         Time remaining (in milliseconds) when search is aborted. Should be a
         positive value large enough to allow the function to return before the
         timer expires.
+
+    inplace : boolean (optional)
+        Flag indicating whether to search by applying and taking back moves on
+        the game board with `push_move()`/`pop_move()` (True) or by creating a
+        copy of the board for every node with `forecast_move()` (False).
+
+    tt_mb : float (optional)
+        Memory budget (in megabytes) of the transposition table used by
+        alpha-beta search; 0 disables the table.
+
+    ordering : boolean (optional)
+        Flag indicating whether alpha-beta search tries the principal
+        variation of the previous iteration, the killer moves of each ply and
+        the moves with the best history scores first (True), or searches the
+        moves in generation order (False).
+
+    workers : int (optional)
+        The number of worker processes searching the root moves in parallel
+        with alpha-beta search; 1 searches in the calling process. The
+        workers are started by the first call to `get_move()` and kept alive
+        until `close()` is called, and each one searches its share of the
+        root moves with its own copy of the player (see `parallel_search`).
+
+    shared_tt : boolean (optional)
+        Flag indicating whether the transposition table is kept in shared
+        memory (see `transposition.SharedTranspositionTable`), in which case
+        the workers of parallel search all read and write this one table
+        instead of a table of their own. Copies of the player made by pickling
+        (e.g., by the workers of a tournament) share the table too. Call
+        `close()` to release it.
+
+    ponder : boolean (optional)
+        Flag indicating whether the player keeps searching in a background
+        process after returning a move: it predicts the opponent's reply from
+        the principal variation (or the transposition table) and searches the
+        resulting position during the opponent's turn. If the reply was
+        predicted correctly, the next call to `get_move()` lets that search
+        finish within its own time limit (a ponder hit); otherwise the search
+        is stopped and the position is searched as usual (a miss). Pondering
+        only helps if a spare CPU core can run the background process, and it
+        needs `ordering` or a transposition table to predict replies.
+
+    endgame : boolean (optional)
+        Flag indicating whether the player solves the game exactly once it is
+        partitioned from its opponent (see `isolation.endgame`), and then
+        plays the first move of its longest path instead of searching. The
+        solver is given half the time left in the turn; if it does not finish
+        the position is searched as usual.
+
+    tablebase : boolean (optional)
+        Flag indicating whether the player plays the perfect move stored in
+        the tablebase of the board size (see `tablebase.py`) instead of
+        searching, when there is a tablebase file for that size.
+
+    opening_search : boolean (optional)
+        Flag indicating whether the first move of the game is searched
+        instead of playing the centre square (see `get_open_game_move()`).
+        The first two plies only generate moves that are distinct under the
+        symmetries of the board: one first move per class of symmetric
+        squares, and one reply per class of squares that are symmetric under
+        the symmetries fixing the first move (see
+        `isolation.distinct_moves()`), which divides the width of the
+        opening plies by up to eight.
+
+    book : boolean (optional)
+        Flag indicating whether the player plays the move stored in the
+        opening book of the board size (see `opening_book.py`) instead of
+        searching, when there is a book file for that size and the position
+        is in it.
     """
     def __init__(self, search_depth=3, score_fn=custom_score,
-                 iterative=True, method='minimax', timeout=10.):
+                 iterative=True, method='minimax', timeout=10., inplace=False,
+                 tt_mb=0, ordering=False, workers=1, shared_tt=False,
+                 ponder=False, endgame=False, tablebase=False,
+                 opening_search=False, book=False):
+        if workers > 1 and method != 'alphabeta':
+            raise ValueError("parallel search requires the 'alphabeta' method")
         self.search_depth = search_depth
         self.iterative = iterative
         self.score = score_fn
         self.method = method
         self.time_left = None
+        self.deadline = None
         self.TIMER_THRESHOLD = timeout
+        self.inplace = inplace
+        self.shared_tt = shared_tt and bool(tt_mb)
+        if self.shared_tt:
+            self.tt = SharedTranspositionTable(tt_mb)
+        else:
+            self.tt = TranspositionTable(tt_mb) if tt_mb else None
+        self.last_move_count = -1
+        self.ordering = ordering
+        self.pv = []
+        self.killers = []
+        self.history = ({}, {})
+        # the (depth, value, move) results of the alpha-beta iterations
+        # completed by the last call to get_move(), and the root moves the
+        # search is restricted to (None for every legal move)
+        self.iterations = []
+        self.root_moves = None
+        # called with the best move of every iteration completed by iterative
+        # deepening (see parallel_search.ponder_worker)
+        self.on_iteration = None
+        self.workers = workers
+        self.worker_args = dict(search_depth=search_depth, score_fn=score_fn,
+                                iterative=iterative, method=method,
+                                timeout=timeout, inplace=inplace, tt_mb=tt_mb,
+                                ordering=ordering, opening_search=opening_search)
+        self.pool = None
+        self.worker_nodes = None
+        self.ponder = ponder
+        self.ponderer = None
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+        self.endgame = endgame
+        # the longest paths solved in the current game, and the move count of
+        # the last position given to the solver
+        self.endgame_memo = {}
+        self.endgame_move_count = -1
+        # the longest paths solved by endgame_score during the current move
+        self.score_memo = {}
+        if score_fn is endgame_score:
+            self.score = functools.partial(endgame_score, memo=self.score_memo)
+        self.tablebase = tablebase
+        self.opening_search = opening_search
+        self.book = book
+
+    def __getstate__(self):
+        # the worker processes belong to the process that started them; a
+        # shared table is pickled by name, so the copy opens the same memory
+        state = self.__dict__.copy()
+        state['pool'] = None
+        state['ponderer'] = None
+        return state
+
+    def close(self):
+        """ Stop the worker processes of parallel search, if any, and release
+        the shared transposition table. """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+        if self.ponderer is not None:
+            self.ponderer.close()
+            self.ponderer = None
+        if self.shared_tt:
+            self.tt.close()
+
+    @property
+    def nodes(self):
+        """ The number of positions visited by the last call to `get_move()`,
+        as counted by its `Deadline` (or by those of the workers or of the
+        pondering search); None if the search was not given one, or if the
+        pondering search did not reply in time.
+        """
+        if self.worker_nodes is not None:
+            return self.worker_nodes
+        if self.deadline is None:
+            return None
+        return self.deadline.calls
 
     def get_move(self, game, legal_moves, time_left):
         """Search for the best move from the available legal moves and return a
@@ -103,35 +299,96 @@ class CustomPlayer:
         time_left : callable
             A function that returns the number of milliseconds left in the
             current turn. Returning with any less than 0 ms remaining forfeits
-            the game.
+            the game. If it is an `isolation.Deadline`, the search only reads
+            the clock every few thousand nodes.
         Returns
         -------
         (int, int)
             Board coordinates corresponding to a legal move; may return
             (-1, -1) if there are no available legal moves.
         """
+        if self.ponder:
+            return self.ponder_move(game, legal_moves, time_left)
+        return self.search_move(game, legal_moves, time_left)
+
+    def search_move(self, game, legal_moves, time_left):
+        """ Search for the best move in the time left (see `get_move()`),
+        without pondering.
+        """
         self.time_left = time_left
+        self.worker_nodes = None
+        if isinstance(time_left, Deadline):
+            self.deadline = time_left.with_margin(self.TIMER_THRESHOLD)
+        else:
+            self.deadline = None
         
         selected_move = (-1, -1)
         depth = self.search_depth
         depth+=1
+        self.score_memo.clear()
         
         if not legal_moves:
             return selected_move
+
+        if self.book:
+            book = load_book(game.width, game.height)
+            entry = book.probe(game) if book is not None else None
+            if entry is not None and entry.move in legal_moves:
+                return entry.move
+
+        if self.tablebase:
+            table = load_tablebase(game.width, game.height)
+            result = table.best_move(game) if table is not None else None
+            if result is not None:
+                return result[0]
         
-        if game.move_count == 0:
+        if self.opening_search:
+            if game.move_count < 2:
+                legal_moves = distinct_moves(game, legal_moves)
+        elif game.move_count == 0:
             selected_move = self.get_open_game_move(game)
             return selected_move
 
+        if self.endgame:
+            selected_move = self.endgame_move(game, legal_moves)
+            if selected_move is not None:
+                return selected_move
+            selected_move = (-1, -1)
+
+        if self.workers > 1:
+            return self.parallel_move(game, legal_moves, time_left)
+
+        self.iterations = []
+        if self.tt is not None:
+            # start every game with an empty table; the keys of the entries
+            # hold the seat of this agent (see `seat_key()`), so entries left
+            # by copies of the player sharing the table stay correct
+            if game.move_count <= self.last_move_count:
+                self.tt.clear()
+            self.tt.new_search()
+        self.last_move_count = game.move_count
+
+        if self.ordering:
+            self.new_ordering_search()
+
         try:
             if self.iterative == True:
+                # no line of play can be longer than the number of open cells,
+                # so deeper iterations would repeat the same search while the
+                # move ordering state (PV and killer tables) grows per depth
+                max_depth = len(game.get_blank_spaces())
                 while True:
                     depth+=1
                     temp = self.get_best_move(game, depth)
                     if temp is not None:
                         selected_move = temp
-                        
-                    if self.time_left() < self.TIMER_THRESHOLD:
+                        if self.on_iteration is not None:
+                            self.on_iteration(selected_move)
+
+                    if depth >= max_depth:
+                        break
+
+                    if self.timed_out(force=True):
                         raise Timeout()
             else:
                 selected_move = self.get_best_move(game, self.search_depth)
@@ -141,6 +398,98 @@ class CustomPlayer:
 
         return selected_move
     
+    def endgame_move(self, game, legal_moves):
+        """ Return the first move of the longest path of the player if it is
+        partitioned from its opponent, or None if it is not or the solver
+        runs out of its share of the turn.
+        """
+        if game.move_count <= self.endgame_move_count:
+            self.endgame_memo = {}
+        self.endgame_move_count = game.move_count
+
+        if self.deadline is not None:
+            expired = self.deadline.with_margin(self.deadline() / 2).expired
+        else:
+            time_left, threshold = self.time_left, self.TIMER_THRESHOLD
+            limit = (time_left() + threshold) / 2
+
+            def expired():
+                return time_left() < limit
+
+        try:
+            solution = solve(game, self.endgame_memo, expired)
+        except Unsolved:
+            return None
+        if solution is None or solution[2] not in legal_moves:
+            return None
+        return solution[2]
+
+    def ponder_move(self, game, legal_moves, time_left):
+        """ Return the result of the pondering search if it searched this
+        position, or else stop it and search the position; then start
+        pondering on the reply predicted for the returned move.
+        """
+        if self.ponderer is None:
+            self.ponderer = PonderSearch(CustomPlayer, self.worker_args)
+
+        result = None
+        if self.ponderer.is_pondering(game):
+            self.ponder_hits += 1
+            result = self.ponderer.finish(time_left, self.TIMER_THRESHOLD)
+            if result is None or result[0] not in legal_moves:
+                # the search did not reply in time, and the rest of the turn
+                # is too short to search again: play the best move of its
+                # last complete iteration
+                move = self.ponderer.partial_move()
+                result = (move if move in legal_moves else legal_moves[0], [], None)
+                self.deadline = None
+        elif self.ponderer.position is not None:
+            self.ponder_misses += 1
+            self.ponderer.stop()
+
+        if result is not None:
+            move, self.pv, self.worker_nodes = result
+        else:
+            self.ponderer.stop()
+            move = self.search_move(game, legal_moves, time_left)
+        pv = self.pv
+
+        reply = self.predicted_reply(game, move, pv)
+        if reply is not None:
+            self.ponderer.start(game.forecast_move(move).forecast_move(reply))
+        return move
+
+    def seat_key(self, game):
+        """ Return the key mixed into the hash of every position stored in the
+        transposition table during a search of this agent: the stored values
+        are relative to the agent, so the entries of the two seats of a
+        position are kept apart.
+        """
+        return SEAT_KEY if game.__player_2__ is self else 0
+
+    def predicted_reply(self, game, move, pv):
+        """ Return the reply to the move expected from the opponent: the next
+        move of the principal variation, or the best move stored in the
+        transposition table for the position after the move. Return None if
+        there is no prediction or the game ends before the next turn.
+        """
+        if move not in game.get_legal_moves():
+            return None
+        after = game.forecast_move(move)
+        replies = after.get_legal_moves()
+        reply = None
+        if len(pv) > 1 and pv[0] == move:
+            reply = pv[1]
+        elif self.tt is not None:
+            entry = self.tt.probe(after.hash ^ self.seat_key(game))
+            if entry is not None:
+                reply = entry[MOVE]
+        if reply not in replies:
+            return None
+        if not after.forecast_move(reply).get_legal_moves():
+            return None
+        return reply
+
     def get_best_move(self, game, depth) :
         """ Allows to get the best move using minimax or alphabeta algorithm based on 
         the method selection.
@@ -168,8 +517,161 @@ class CustomPlayer:
             return move
         elif self.method == 'alphabeta':
             (utility, move) = self.alphabeta(game, depth)
+            self.iterations.append((depth, utility, move))
             return move
-                    
+
+    def parallel_move(self, game, legal_moves, time_left):
+        """ Search the legal moves in the worker processes and return the best
+        move of the deepest iteration completed by every worker.
+
+        The workers stop searching `TIMER_THRESHOLD` milliseconds before the
+        end of the turn. The values of their best moves are only compared at
+        the same depth, where they are the exact alpha-beta values of the
+        root moves; a worker that did not complete any iteration in time is
+        left out.
+        """
+        if len(legal_moves) == 1:
+            return legal_moves[0]
+        if self.pool is None:
+            if self.shared_tt:
+                self.pool = SearchPool(self.workers, CustomPlayer,
+                                       dict(self.worker_args, tt_mb=0), self.tt)
+            else:
+                self.pool = SearchPool(self.workers, CustomPlayer, self.worker_args)
+        if self.shared_tt:
+            # the workers neither clear the table they share nor start its
+            # searches (see parallel_search.search_worker)
+            if game.move_count <= self.last_move_count:
+                self.tt.clear()
+            self.tt.new_search()
+            self.last_move_count = game.move_count
+
+        replies = self.pool.search(game, legal_moves, time_left,
+                                   self.TIMER_THRESHOLD)
+        self.worker_nodes = sum(nodes or 0 for _, nodes in replies)
+        iterations = [reply for reply, _ in replies if reply]
+        if not iterations:
+            return legal_moves[0]
+        depth = min(reply[-1][0] for reply in iterations)
+        results = [result for reply in iterations for result in reply
+                   if result[0] == depth]
+        _, _, move = max(results, key=lambda result: result[1])
+        return move
+
+    def new_ordering_search(self):
+        """ Reset the move ordering state at the start of a new search. The
+        principal variation and killer moves only apply to the previous
+        position, while history scores are aged so that recent cutoffs count
+        more than old ones.
+        """
+        self.pv = []
+        self.killers = []
+        for history in self.history:
+            for move in history:
+                history[move] //= 2
+
+    def order_moves(self, moves, ply, side, pv_move=None, hash_move=None):
+        """ Sort moves so that the most promising ones are searched first:
+        the principal variation move, the transposition table move, the killer
+        moves of the ply, then the remaining moves by decreasing history score.
+
+        Parameters
+        ----------
+        moves : list<(int, int)>
+            The legal moves of the current game state
+
+        ply : int
+            Distance (in plies) of the current game state from the root
+
+        side : {0, 1}
+            0 for maximizing nodes, 1 for minimizing nodes
+
+        pv_move : (int, int) (optional)
+            The principal variation move of the previous iteration, if the
+            current game state lies on it
+
+        hash_move : (int, int) (optional)
+            The best move stored in the transposition table
+
+        Returns
+        -------
+        list<(int, int)>
+            The moves in search order
+        """
+        if len(moves) < 2:
+            return moves
+        history = self.history[side]
+        moves = sorted(moves, key=lambda m: -history.get(m, 0))
+        first = []
+        for move in (pv_move, hash_move) + tuple(self.killers[ply]):
+            if move is not None and move in moves and move not in first:
+                first.append(move)
+        if first:
+            moves = first + [m for m in moves if m not in first]
+        return moves
+
+    def update_ordering(self, ply, side, move, depth):
+        """ Record a move that caused a cutoff as a killer move of the ply
+        and increase its history score by the square of the remaining depth.
+        """
+        killers = self.killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        history = self.history[side]
+        history[move] = history.get(move, 0) + depth * depth
+
+    def timed_out(self, force=False):
+        """ Test whether the search must be aborted to return before the end
+        of the turn. With a `Deadline` the clock is only read when the
+        deadline schedules it, unless `force` is set; with a plain
+        `time_left` function the clock is read on every call.
+        """
+        deadline = self.deadline
+        if deadline is None:
+            return self.time_left() < self.TIMER_THRESHOLD
+        return deadline.check() if force else deadline.expired()
+
+    def child_value(self, game, move, value_fn, *args):
+        """ Evaluate the successor of the game reached by applying the move,
+        using either an in-place move and take-back or a board copy depending
+        on the `inplace` flag.
+
+        Parameters
+        ----------
+        game : isolation.Board
+            An instance of the Isolation game `Board` class representing the
+            current game state
+
+        move : (int, int)
+            The move of the active player leading to the successor state
+
+        value_fn : callable
+            The search function called on the successor state with any
+            remaining positional arguments
+
+        Returns
+        -------
+        float
+            The value returned by `value_fn` for the successor state
+        """
+        if self.inplace:
+            game.push_move(move)
+            try:
+                return value_fn(game, *args)
+            finally:
+                game.pop_move()
+        return value_fn(game.forecast_move(move), *args)
+
+
+    def search_moves(self, game):
+        """ Return the moves searched from a game state: its legal moves, or
+        only the moves that are distinct under symmetry in the first two
+        plies if `opening_search` is set. """
+        moves = game.get_legal_moves()
+        if self.opening_search and game.move_count < 2:
+            moves = distinct_moves(game, moves)
+        return moves
 
     def minimax(self, game, depth):
         """ minimax search algorithm.
@@ -194,9 +696,8 @@ class CustomPlayer:
         utilities = [] 
 
         try:
-            for move in game.get_legal_moves():
-                new_game = game.forecast_move(move)
-                utility = self.min_value(new_game, depth-1)
+            for move in self.search_moves(game):
+                utility = self.child_value(game, move, self.min_value, depth-1)
                 utilities.append((utility, move))
         except Timeout:
             pass
@@ -208,7 +709,7 @@ class CustomPlayer:
         return (utility, selected_move) 
     
     def max_value(self, game, depth) :
-        if self.time_left() < self.TIMER_THRESHOLD:
+        if self.timed_out():
             raise Timeout()
         
         if depth <= 0:
@@ -216,14 +717,13 @@ class CustomPlayer:
         
         utility = float("-inf")
          
-        for move in game.get_legal_moves():
-            new_game = game.forecast_move(move)
-            utility = max(utility, self.min_value(new_game, depth-1))
+        for move in self.search_moves(game):
+            utility = max(utility, self.child_value(game, move, self.min_value, depth-1))
                         
         return utility
     
     def min_value(self, game, depth) :
-        if self.time_left() < self.TIMER_THRESHOLD:
+        if self.timed_out():
             raise Timeout()
         
         if depth <= 0:
@@ -231,9 +731,8 @@ class CustomPlayer:
         
         utility = float("inf")
         
-        for move in game.get_legal_moves():
-            new_game = game.forecast_move(move)
-            utility = min(utility, self.max_value(new_game, depth-1))
+        for move in self.search_moves(game):
+            utility = min(utility, self.child_value(game, move, self.max_value, depth-1))
         return utility
     
 
@@ -263,55 +762,188 @@ class CustomPlayer:
         tuple(int, int)
             The best move for the current branch; (-1, -1) for no legal moves
         """
-        if self.time_left() < self.TIMER_THRESHOLD:
+        if self.timed_out():
             raise Timeout()
-        
+
+        timed_out = self.timed_out
+        tt = self.tt
+        seat = self.seat_key(game)
+        ordering = self.ordering
+        root_depth = depth
+        # only the first two plies of a game have moves to reduce
+        opening = self.opening_search and game.move_count < 2
+        if ordering:
+            # pv_table[ply] is the principal variation found below the node
+            # at that ply; on_pv[ply] tells whether the node at that ply was
+            # reached by following the principal variation of the previous
+            # iteration
+            pv = self.pv
+            pv_table = [[] for _ in range(depth + 2)]
+            on_pv = [True] + [False] * (depth + 1)
+            self.killers.extend([] for _ in range(depth + 1 - len(self.killers)))
+
         def alphabeta_max_value(game, depth, alpha, beta):
+            if timed_out():
+                raise Timeout()
+
             if depth == 0:
                 return self.score(game, game.active_player)
-            
+
+            moves = game.get_legal_moves()
+            if opening and game.move_count < 2:
+                moves = distinct_moves(game, moves)
+            hash_move = None
+            if tt is not None:
+                entry = tt.probe(game.hash ^ seat)
+                if entry is not None:
+                    _, entry_depth, flag, value, hash_move, _ = entry
+                    if entry_depth >= depth:
+                        if flag == EXACT:
+                            return value
+                        elif flag == LOWER:
+                            alpha = max(alpha, value)
+                        else:
+                            beta = min(beta, value)
+                        if alpha >= beta:
+                            return value
+            alpha_orig = alpha
+
+            if ordering:
+                ply = root_depth - depth
+                pv_move = pv[ply] if on_pv[ply] and ply < len(pv) else None
+                moves = self.order_moves(moves, ply, 0, pv_move, hash_move)
+            elif hash_move is not None:
+                moves = hash_move_first(moves, hash_move)
+
             utility = float("-inf")
-            
-            for move in game.get_legal_moves():
-                new_game = game.forecast_move(move)
-                utility = max(utility, alphabeta_min_value(new_game, depth-1, alpha, beta))
+            best_move = None
+
+            for move in moves:
+                if ordering:
+                    on_pv[ply + 1] = move == pv_move
+                    pv_table[ply + 1] = []
+                value = self.child_value(game, move, alphabeta_min_value,
+                                         depth-1, alpha, beta)
+                if value > utility or best_move is None:
+                    utility, best_move = value, move
+                    if ordering:
+                        pv_table[ply] = [move] + pv_table[ply + 1]
                 if utility >= beta:
-                    return utility
+                    if ordering:
+                        self.update_ordering(ply, 0, move, depth)
+                    break
                 alpha = max(alpha, utility)
+
+            if tt is not None:
+                flag = UPPER if utility <= alpha_orig else LOWER if utility >= beta else EXACT
+                tt.store(game.hash ^ seat, depth, flag, utility, best_move)
             return utility
-    
+
         def alphabeta_min_value(game, depth, alpha, beta):
+            if timed_out():
+                raise Timeout()
+
             if depth == 0:
                 return self.score(game, game.inactive_player)
-            
+
+            moves = game.get_legal_moves()
+            if opening and game.move_count < 2:
+                moves = distinct_moves(game, moves)
+            hash_move = None
+            if tt is not None:
+                entry = tt.probe(game.hash ^ seat)
+                if entry is not None:
+                    _, entry_depth, flag, value, hash_move, _ = entry
+                    if entry_depth >= depth:
+                        if flag == EXACT:
+                            return value
+                        elif flag == LOWER:
+                            alpha = max(alpha, value)
+                        else:
+                            beta = min(beta, value)
+                        if alpha >= beta:
+                            return value
+            beta_orig = beta
+
+            if ordering:
+                ply = root_depth - depth
+                pv_move = pv[ply] if on_pv[ply] and ply < len(pv) else None
+                moves = self.order_moves(moves, ply, 1, pv_move, hash_move)
+            elif hash_move is not None:
+                moves = hash_move_first(moves, hash_move)
+
             utility = float("inf")
-            
-            for move in game.get_legal_moves():
-                new_game =  game.forecast_move(move)
-                utility = min(utility, alphabeta_max_value(new_game, depth-1, alpha, beta))
+            best_move = None
+
+            for move in moves:
+                if ordering:
+                    on_pv[ply + 1] = move == pv_move
+                    pv_table[ply + 1] = []
+                value = self.child_value(game, move, alphabeta_max_value,
+                                         depth-1, alpha, beta)
+                if value < utility or best_move is None:
+                    utility, best_move = value, move
+                    if ordering:
+                        pv_table[ply] = [move] + pv_table[ply + 1]
                 if utility <= alpha:
-                    return utility
+                    if ordering:
+                        self.update_ordering(ply, 1, move, depth)
+                    break
                 beta = min(beta, utility)
-                
+
+            if tt is not None:
+                flag = LOWER if utility >= beta_orig else UPPER if utility <= alpha else EXACT
+                tt.store(game.hash ^ seat, depth, flag, utility, best_move)
             return utility
-        
-        utility = alphabeta_max_value(game, depth, alpha, beta) 
 
+        if depth == 0:
+            return (self.score(game, game.active_player), None)
+
+        # The root is searched like a maximizing node, but it keeps track of
+        # the best move and never returns early from the transposition table
+        moves = self.root_moves
+        if moves is None:
+            moves = self.search_moves(game)
+        hash_move = None
+        if tt is not None:
+            entry = tt.probe(game.hash ^ seat)
+            if entry is not None:
+                hash_move = entry[MOVE]
+        alpha_orig = alpha
+
+        if ordering:
+            pv_move = pv[0] if pv else None
+            moves = self.order_moves(moves, 0, 0, pv_move, hash_move)
+        elif hash_move is not None:
+            moves = hash_move_first(moves, hash_move)
+
+        utility = float("-inf")
         selected_move = None
-         
-        for move in game.get_legal_moves():
-            new_game = game.forecast_move(move)
-            
-            if hasattr(game, 'counter'):
-                game.counter[move] -= 1
-                 
-            game_utility = self.score(new_game, new_game.active_player)
-            if utility == game_utility:
-                selected_move = move
+
+        for move in moves:
+            if ordering:
+                on_pv[1] = move == pv_move
+                pv_table[1] = []
+            value = self.child_value(game, move, alphabeta_min_value,
+                                     depth-1, alpha, beta)
+            if value > utility or selected_move is None:
+                utility, selected_move = value, move
+                if ordering:
+                    pv_table[0] = [move] + pv_table[1]
+            if utility >= beta:
+                if ordering:
+                    self.update_ordering(0, 0, move, depth)
                 break
-                   
+            alpha = max(alpha, utility)
+
+        if tt is not None:
+            flag = UPPER if utility <= alpha_orig else LOWER if utility >= beta else EXACT
+            tt.store(game.hash ^ seat, depth, flag, utility, selected_move)
+        if ordering:
+            self.pv = pv_table[0]
+
         return (utility, selected_move)
-    
+
     def get_open_game_move(self, game):
         row = game.height//2
         col = game.width//2
@@ -9,8 +9,13 @@ legal moves loses, and the opponent is declared the winner.
 
 import io
 
-# Make the Board class available at the root of the module for imports
+# Make the Board classes available at the root of the module for imports
 from .isolation import Board
+from .bitboard import BitBoard
+from .deadline import Deadline
+from .geometry import Geometry, board_geometry
+from .symmetry import board_symmetries, symmetry_tables, canonical_position
+from .symmetry import distinct_moves
 
 
 def game_as_text(winner, move_history, termination="", board=Board(1, 2)):
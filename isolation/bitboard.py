@@ -0,0 +1,237 @@
+"""
+This file contains the `BitBoard` class, an alternative engine for the game
+Isolation that exposes the same public API as `isolation.Board` but stores
+the blocked cells of the board as the bits of a single integer.
+
+Cell (row, col) maps to bit `row * width + col`. Legal moves are generated by
+AND-ing a precomputed knight-attack mask for the player's square with the
+mask of free cells, so move generation never bounds-checks individual
+offsets. The resulting mask is translated into a move list through a cache
+shared by all boards of the same size. Because the bits are visited from
+least to most significant, moves are returned in exactly the same order as
+`Board.get_legal_moves()`.
+"""
+
+from .isolation import Board
+
+
+try:
+    popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    popcount = lambda bits: bin(bits).count("1")
+
+
+class BitBoard(Board):
+    """
+    Implement a model for the game Isolation assuming each player moves like
+    a knight in chess, keeping the blocked cells in an integer bitmask.
+
+    `BitBoard` is a drop-in replacement for `Board`: it accepts the same
+    constructor arguments and can be used anywhere a `Board` is expected,
+    including `Board.play()`.
+
+    Parameters
+    ----------
+    player_1 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    player_2 : object
+        An object with a get_move() function. This is the only function
+        directly called by the Board class for each player.
+
+    width : int (optional)
+        The number of columns that the board should have.
+
+    height : int (optional)
+        The number of rows that the board should have.
+    """
+    __slots__ = ('__attacks__', '__mask_squares__')
+
+    def __init__(self, player_1, player_2, width=7, height=7):
+        super(BitBoard, self).__init__(player_1, player_2, width=width, height=height)
+        # the occupied cells, one bit per square
+        self.__board_state__ = 0
+        self.__attacks__ = self.__geometry__.attacks
+        self.__mask_squares__ = self.__geometry__.mask_squares
+
+    def copy(self):
+        """ Return a deep copy of the current board. """
+        new_board = BitBoard.__new__(BitBoard)
+        self.__copy_to__(new_board)
+        new_board.__board_state__ = self.__board_state__
+        new_board.__attacks__ = self.__attacks__
+        new_board.__mask_squares__ = self.__mask_squares__
+        return new_board
+
+    def move_is_legal(self, move):
+        """
+        Test whether a move is legal in the current game state.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+
+        Returns
+        ----------
+        bool
+            Returns True if the move is legal, False otherwise
+        """
+        row, col = move
+        return 0 <= row < self.height and \
+               0 <= col < self.width and \
+               not self.__board_state__ >> (row * self.width + col) & 1
+
+    def get_blank_spaces(self):
+        """
+        Return a list of the locations that are still available on the board.
+        """
+        occupied = self.__board_state__
+        squares = self.__geometry__.squares
+        return [squares[i] for i in self.__geometry__.column_order
+                if not occupied >> i & 1]
+
+    def blank_mask(self):
+        """
+        Return the blank squares of the board as a bitmask (see
+        `Board.blank_mask()`).
+        """
+        return ~self.__board_state__ & ((1 << (self.width * self.height)) - 1)
+
+    def get_legal_moves(self, player=None):
+        """
+        Return the list of all legal moves for the specified player.
+
+        Parameters
+        ----------
+        player : object (optional)
+            An object registered as a player in the current game. If None,
+            return the legal moves for the active player on the board.
+
+        Returns
+        ----------
+        list<(int, int)>
+            The list of coordinate pairs (row, column) of all legal moves
+            for the player constrained by the current game state.
+        """
+        if player is None:
+            player = self.__active_player__
+        loc = self.__last_player_move__[player]
+        if loc == Board.NOT_MOVED:
+            return self.get_blank_spaces()
+
+        bits = self.__attacks__[loc[0] * self.width + loc[1]] & ~self.__board_state__
+        moves = self.__mask_squares__.get(bits)
+        if moves is None:
+            moves = self.__mask_moves__(bits)
+        return list(moves)
+
+    def __mask_moves__(self, bits):
+        """ Translate a mask of squares into the tuple of their coordinate
+        pairs and cache the result for every board of the same size. """
+        bit_squares = self.__geometry__.bit_squares
+        moves = []
+        mask = bits
+        while mask:
+            low = mask & -mask
+            moves.append(bit_squares[low])
+            mask ^= low
+        moves = tuple(moves)
+        self.__mask_squares__[bits] = moves
+        return moves
+
+    def apply_move(self, move):
+        """
+        Move the active player to a specified location.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+
+        Returns
+        ----------
+        None
+        """
+        row, col = move
+        self.__update_hash__(move)
+        self.__last_player_move__[self.__active_player__] = move
+        self.__board_state__ |= 1 << (row * self.width + col)
+        self.__active_player__, self.__inactive_player__ = self.__inactive_player__, self.__active_player__
+        self.move_count += 1
+
+    def __clear_cell__(self, move):
+        """ Mark the cell at the specified location as blank. """
+        row, col = move
+        self.__board_state__ &= ~(1 << (row * self.width + col))
+
+    def __has_moves__(self, player):
+        """ Test whether the specified player has at least one legal move. """
+        loc = self.__last_player_move__[player]
+        if loc == Board.NOT_MOVED:
+            full = (1 << (self.width * self.height)) - 1
+            return self.__board_state__ != full
+        return bool(self.__attacks__[loc[0] * self.width + loc[1]] & ~self.__board_state__)
+
+    def __count_moves__(self, loc):
+        """ Count the legal moves of a player standing at the specified
+        location. """
+        if loc == Board.NOT_MOVED:
+            return self.width * self.height - popcount(self.__board_state__)
+        return popcount(self.__attacks__[loc[0] * self.width + loc[1]] & ~self.__board_state__)
+
+    def is_winner(self, player):
+        """ Test whether the specified player has won the game. """
+        return player == self.__inactive_player__ and not self.__has_moves__(self.__active_player__)
+
+    def is_loser(self, player):
+        """ Test whether the specified player has lost the game. """
+        return player == self.__active_player__ and not self.__has_moves__(self.__active_player__)
+
+    def utility(self, player):
+        """
+        Returns the utility of the current game state from the perspective
+        of the specified player. See `Board.utility()`.
+        """
+        if not self.__has_moves__(self.__active_player__):
+
+            if player == self.__inactive_player__:
+                return float("inf")
+
+            if player == self.__active_player__:
+                return float("-inf")
+
+        return 0.
+
+    def to_string(self):
+        """Generate a string representation of the current game state, marking
+        the location of each player and indicating which cells have been
+        blocked, and which remain open.
+        """
+
+        p1_loc = self.__last_player_move__[self.__player_1__]
+        p2_loc = self.__last_player_move__[self.__player_2__]
+
+        out = ''
+
+        for i in range(self.height):
+            out += ' | '
+
+            for j in range(self.width):
+
+                if not self.__board_state__ >> (i * self.width + j) & 1:
+                    out += ' '
+                elif p1_loc and i == p1_loc[0] and j == p1_loc[1]:
+                    out += '1'
+                elif p2_loc and i == p2_loc[0] and j == p2_loc[1]:
+                    out += '2'
+                else:
+                    out += '-'
+
+                out += ' | '
+            out += '\n\r'
+
+        return out
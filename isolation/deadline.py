@@ -0,0 +1,137 @@
+"""
+This file contains the `Deadline` class, a cooperative time budget for a
+single turn of Isolation.
+
+A `Deadline` is callable and returns the number of milliseconds left in the
+turn, so it can be used anywhere the legacy `time_left` function is expected.
+Search algorithms should call `Deadline.expired()` instead: it only reads the
+clock once every few thousand calls, and reads it more often as the deadline
+gets closer so that the delay between the deadline passing and the search
+noticing it stays bounded.
+"""
+
+import time
+
+
+# Clocks that a turn can be budgeted on: elapsed wall-clock time, CPU time of
+# the calling thread, or CPU time of the whole process. CPU clocks do not run
+# while the process is waiting to be scheduled, so they keep time budgets
+# fair when many games share a loaded machine, but they do not stop a player
+# that blocks (e.g., sleeps or waits for another process) from overrunning.
+CLOCKS = {
+    "wall": time.perf_counter_ns,
+    "thread": time.thread_time_ns,
+    "process": time.process_time_ns,
+}
+
+
+class Deadline(object):
+    """
+    Track the time left before the end of a turn.
+
+    Parameters
+    ----------
+    time_limit : numeric
+        The number of milliseconds available from the creation of the object.
+
+    check_every : int (optional)
+        The maximum number of calls to `expired()` between two clock reads.
+
+    clock : callable or str (optional)
+        A function returning a monotonic time in nanoseconds, or the name of
+        one of the `CLOCKS` ("wall", "thread" or "process").
+    """
+    __slots__ = ('clock', 'start', 'end', 'check_every', 'interval',
+                 'countdown', 'last_check', 'calls_checked', 'clock_calls',
+                 'expired_at')
+
+    def __init__(self, time_limit, check_every=4096, clock=time.perf_counter_ns):
+        if isinstance(clock, str):
+            clock = CLOCKS[clock]
+        self.clock = clock
+        self.start = clock()
+        self.end = self.start + int(time_limit * 1e6)
+        self.check_every = check_every
+        # the first clock read happens on the first call so that the rate of
+        # calls can be measured from then on
+        self.interval = 1
+        self.countdown = 1
+        self.last_check = self.start
+        self.calls_checked = 0
+        self.clock_calls = 0
+        self.expired_at = None
+
+    def __call__(self):
+        """ Return the number of milliseconds left before the deadline. """
+        return (self.end - self.clock()) / 1e6
+
+    def with_margin(self, millis):
+        """
+        Return a new deadline on the same clock that expires the specified
+        number of milliseconds before this one.
+        """
+        deadline = Deadline(0, self.check_every, self.clock)
+        deadline.start = self.start
+        deadline.end = self.end - int(millis * 1e6)
+        return deadline
+
+    @property
+    def calls(self):
+        """ The number of calls made to `expired()` so far. """
+        return self.calls_checked + self.interval - self.countdown
+
+    @property
+    def latency(self):
+        """
+        The number of milliseconds between the deadline and the first call
+        to `expired()` that reported it, or None if it was never reported.
+        """
+        if self.expired_at is None:
+            return None
+        return (self.expired_at - self.end) / 1e6
+
+    def elapsed(self):
+        """ Return the number of milliseconds since the start of the turn. """
+        return (self.clock() - self.start) / 1e6
+
+    def expired(self):
+        """
+        Test whether the deadline has passed, reading the clock only when the
+        countdown of calls since the previous clock read reaches zero.
+        """
+        self.countdown -= 1
+        if self.countdown > 0:
+            return False
+        return self.check()
+
+    def check(self):
+        """
+        Read the clock and test whether the deadline has passed, then
+        schedule the next clock read for `expired()`.
+
+        The next read happens after at most `check_every` calls, and no later
+        than half the remaining time at the rate of calls observed since the
+        previous read. The number of calls between reads at most doubles from
+        one read to the next, so a rate measured over a few fast calls cannot
+        let a long run of slow calls overshoot the deadline.
+        """
+        now = self.clock()
+        self.clock_calls += 1
+        calls = self.interval - self.countdown
+        self.calls_checked += calls
+
+        if now >= self.end:
+            if self.expired_at is None:
+                self.expired_at = now
+            self.interval = self.countdown = 1
+            return True
+
+        elapsed = now - self.last_check
+        if elapsed > 0:
+            interval = calls * (self.end - now) // (2 * elapsed)
+        else:
+            interval = self.check_every
+        interval = min(self.check_every, 2 * max(1, calls), interval)
+        self.interval = self.countdown = max(1, interval)
+        self.last_check = now
+        return False
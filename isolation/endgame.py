@@ -0,0 +1,215 @@
+"""
+This file contains an exact solver for the endgame of Isolation once the
+players are partitioned.
+
+The players are partitioned when no blank square can be reached by both of
+them, following knight moves over blank squares. From then on they cannot
+block each other any more, so each one can only make as many moves as the
+longest knight path through its own region, and the player to move wins if
+and only if its longest path is longer than its opponent's.
+
+Regions and paths are bitmasks with bit `row * width + col` set for each
+square, as in `Geometry.attacks`. The longest paths are memoised on the
+(square, open squares) pair, so paths through the same squares in a
+different order are only searched once.
+"""
+
+import itertools
+
+from .bitboard import popcount
+from .geometry import board_geometry
+
+
+class Unsolved(Exception):
+    """ Raised when a search for a longest path is aborted. """
+    pass
+
+
+def reachable(geometry, open_mask, start):
+    """
+    Flood fill the squares that a knight on the square `start` can reach by
+    moving over the open squares.
+
+    Parameters
+    ----------
+    geometry : Geometry
+        The lookup tables of the board.
+
+    open_mask : int
+        The bitmask of the squares the knight may move over.
+
+    start : int
+        The square index of the knight.
+
+    Returns
+    ----------
+    int
+        The bitmask of the reachable squares (without `start`).
+    """
+    attacks = geometry.attacks
+    region = 0
+    frontier = attacks[start] & open_mask
+    while frontier:
+        region |= frontier
+        spread = 0
+        while frontier:
+            low = frontier & -frontier
+            spread |= attacks[low.bit_length() - 1]
+            frontier ^= low
+        frontier = spread & open_mask & ~region
+    return region
+
+
+def partition(game):
+    """
+    Find the regions of the active and inactive players of a game if they
+    are partitioned.
+
+    Returns
+    ----------
+    (int, int) or None
+        The bitmasks of the squares reachable by the active player and by
+        the inactive player, or None if the players are not partitioned
+        (including when a player has not moved yet).
+    """
+    own = game.get_player_location(game.active_player)
+    opp = game.get_player_location(game.inactive_player)
+    if own is None or opp is None:
+        return None
+    geometry = board_geometry(game.width, game.height)
+    blank = game.blank_mask()
+    own_region = reachable(geometry, blank, own[0] * game.width + own[1])
+    opp_region = reachable(geometry, blank, opp[0] * game.width + opp[1])
+    if own_region & opp_region:
+        return None
+    return own_region, opp_region
+
+
+def longest_path(geometry, open_mask, start, memo=None, expired=None):
+    """
+    Compute the longest knight path from the square `start` over the open
+    squares.
+
+    Parameters
+    ----------
+    geometry : Geometry
+        The lookup tables of the board.
+
+    open_mask : int
+        The bitmask of the squares the knight may visit; squares that the
+        knight cannot reach should be left out so that the memo is shared
+        between more paths.
+
+    start : int
+        The square index of the knight.
+
+    memo : dict (optional)
+        Cache of the longest paths already computed on the same board
+        geometry, keyed by (square, open squares).
+
+    expired : callable (optional)
+        A function returning True when the search must be aborted; it is
+        called once per square visited.
+
+    Returns
+    ----------
+    (int, int)
+        The number of moves of the longest path and the square index of its
+        first move (-1 if the knight cannot move).
+
+    Raises
+    ----------
+    Unsolved
+        If `expired()` returned True.
+    """
+    if memo is None:
+        memo = {}
+    neighbours = geometry.neighbours
+
+    def search(square, mask):
+        key = (square, mask)
+        result = memo.get(key)
+        if result is not None:
+            return result
+        if expired is not None and expired():
+            raise Unsolved()
+        best, best_move = 0, -1
+        limit = popcount(mask)
+        for n in neighbours[square]:
+            bit = 1 << n
+            if mask & bit:
+                length = search(n, mask ^ bit)[0] + 1
+                if length > best:
+                    best, best_move = length, n
+                    # a path cannot visit more squares than are open
+                    if best == limit:
+                        break
+        memo[key] = result = (best, best_move)
+        return result
+
+    return search(start, open_mask)
+
+
+def solve(game, memo=None, expired=None):
+    """
+    Solve a game in which the players are partitioned.
+
+    Parameters
+    ----------
+    game : isolation.Board
+        The game to solve.
+
+    memo, expired :
+        See `longest_path()`.
+
+    Returns
+    ----------
+    (int, int, (int, int)) or None
+        The lengths of the longest paths of the active and inactive players,
+        and the first move of the longest path of the active player (None if
+        it cannot move); or None if the players are not partitioned. The
+        active player wins if and only if its path is longer.
+
+    Raises
+    ----------
+    Unsolved
+        If `expired()` returned True.
+    """
+    regions = partition(game)
+    if regions is None:
+        return None
+    geometry = board_geometry(game.width, game.height)
+    width = game.width
+    own = game.get_player_location(game.active_player)
+    opp = game.get_player_location(game.inactive_player)
+    own_length, move = longest_path(geometry, regions[0], own[0] * width + own[1],
+                                    memo, expired)
+    opp_length, _ = longest_path(geometry, regions[1], opp[0] * width + opp[1],
+                                 memo, expired)
+    return own_length, opp_length, geometry.squares[move] if move >= 0 else None
+
+
+def partition_utility(game, player, max_squares=16, memo=None, max_nodes=256):
+    """
+    Return the exact utility of a partitioned game for a player: +inf if it
+    wins with best play and -inf if it loses, or None if the players are not
+    partitioned, one of their regions has more than `max_squares` squares,
+    or the longest paths are not found after visiting `max_nodes` squares
+    (which could take too long to solve inside a heuristic). The paths
+    completed before giving up are kept in the `memo`.
+    """
+    regions = partition(game)
+    if regions is None:
+        return None
+    if max(popcount(region) for region in regions) > max_squares:
+        return None
+    nodes = itertools.count()
+    try:
+        own_length, opp_length, _ = solve(game, memo,
+                                          lambda: next(nodes) >= max_nodes)
+    except Unsolved:
+        return None
+    active_wins = own_length > opp_length
+    if active_wins == (player == game.active_player):
+        return float("inf")
+    return float("-inf")
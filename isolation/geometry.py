@@ -0,0 +1,68 @@
+"""
+This file contains the lookup tables describing the knight moves on a board
+of a given size. The tables are built once per (width, height) and shared by
+every board, player and heuristic that works on that geometry.
+
+Squares are identified by their index `row * width + col`. The coordinate
+pairs stored in the tables are created once, so move lists built from them
+reuse the same tuple objects instead of allocating new ones.
+"""
+
+from collections import namedtuple
+
+
+DIRECTIONS = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
+              (1, -2),  (1, 2), (2, -1),  (2, 1)]
+
+Geometry = namedtuple("Geometry", ["width", "height", "squares", "neighbours",
+                                   "neighbour_squares", "attacks", "bit_squares",
+                                   "column_order", "mask_squares"])
+
+_GEOMETRIES = {}
+
+
+def board_geometry(width, height):
+    """
+    Return the lookup tables for a board geometry, building them on first use.
+
+    Parameters
+    ----------
+    width : int
+        The number of columns of the board.
+
+    height : int
+        The number of rows of the board.
+
+    Returns
+    ----------
+    Geometry
+        `squares[i]` is the (row, column) pair of square index i,
+        `neighbours[i]` the tuple of square indices a knight on square i can
+        reach and `neighbour_squares[i]` their (row, column) pairs (both in
+        the order used by `Board.get_legal_moves()`), `attacks[i]` the same
+        squares as a bitmask, `bit_squares` maps each single-bit mask to its
+        (row, column) pair, and `column_order` lists the square indices in
+        the column-major order used by `Board.get_blank_spaces()`.
+        `mask_squares` is a cache, filled on demand by `BitBoard`, mapping a
+        subset of the squares of an attack mask to the tuple of their
+        (row, column) pairs.
+    """
+    geometry = _GEOMETRIES.get((width, height))
+    if geometry is not None:
+        return geometry
+
+    squares = tuple((r, c) for r in range(height) for c in range(width))
+    neighbours = []
+    for r, c in squares:
+        neighbours.append(tuple((r + dr) * width + c + dc for dr, dc in DIRECTIONS
+                                if 0 <= r + dr < height and 0 <= c + dc < width))
+    neighbours = tuple(neighbours)
+    neighbour_squares = tuple(tuple(squares[i] for i in n) for n in neighbours)
+    attacks = tuple(sum(1 << i for i in n) for n in neighbours)
+    bit_squares = {1 << i: square for i, square in enumerate(squares)}
+    column_order = tuple(r * width + c for c in range(width) for r in range(height))
+
+    geometry = Geometry(width, height, squares, neighbours, neighbour_squares,
+                        attacks, bit_squares, column_order, {})
+    _GEOMETRIES[(width, height)] = geometry
+    return geometry
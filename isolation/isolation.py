@@ -8,14 +8,57 @@ remain compatible with the defaults provided, and none of your changes will
 be available to project reviewers.
 """
 
-import timeit
+import random
+import time
 
-from copy import deepcopy
-from copy import copy
+from collections import namedtuple
+
+from .deadline import CLOCKS, Deadline
+from .geometry import board_geometry
 
 
 TIME_LIMIT_MILLIS = 200
 
+ZOBRIST_SEED = 0x15014710
+
+ZobristKeys = namedtuple("ZobristKeys", ["blocked", "location", "side"])
+
+_ZOBRIST_KEYS = {}
+
+
+def zobrist_keys(width, height):
+    """
+    Return the random 64-bit keys used to hash positions on a board geometry,
+    building them on first use. The keys are generated from a fixed seed so
+    that hashes are reproducible across processes and program runs.
+
+    Parameters
+    ----------
+    width : int
+        The number of columns of the board.
+
+    height : int
+        The number of rows of the board.
+
+    Returns
+    ----------
+    ZobristKeys
+        `blocked[i]` is the key of a blocked cell at square index
+        `i = row * width + col`, `location[s][i]` is the key of the player
+        with symbol `s` (1 or 2) standing on square `i`, and `side` is the key
+        toggled on every ply (i.e., present when player 2 is to move).
+    """
+    keys = _ZOBRIST_KEYS.get((width, height))
+    if keys is not None:
+        return keys
+
+    rng = random.Random(ZOBRIST_SEED ^ (width << 16) ^ height)
+    size = width * height
+    new_keys = lambda: [rng.getrandbits(64) for _ in range(size)]
+    keys = ZobristKeys(new_keys(), [None, new_keys(), new_keys()], rng.getrandbits(64))
+    _ZOBRIST_KEYS[(width, height)] = keys
+    return keys
+
 
 class Board(object):
     """
@@ -41,6 +84,18 @@ class Board(object):
     BLANK = 0
     NOT_MOVED = None
 
+    # Translation table mapping BLANK cells to the digit 1 and every other
+    # cell to the digit 0 (see blank_mask())
+    __blank_digits__ = b"1" + b"0" * 255
+
+    # The board is stored as a flat bytearray holding the symbol of the
+    # player that blocked each cell (or BLANK), indexed by row * width + col,
+    # so that copying the state is a single buffer copy.
+    __slots__ = ('width', 'height', 'move_count', '__player_1__', '__player_2__',
+                 '__active_player__', '__inactive_player__', '__board_state__',
+                 '__last_player_move__', '__player_symbols__', '__undo_stack__',
+                 '__zobrist_keys__', '__zobrist__', '__geometry__')
+
     def __init__(self, player_1, player_2, width=7, height=7):
         self.width = width
         self.height = height
@@ -49,9 +104,13 @@ class Board(object):
         self.__player_2__ = player_2
         self.__active_player__ = player_1
         self.__inactive_player__ = player_2
-        self.__board_state__ = [[Board.BLANK for i in range(width)] for j in range(height)]
+        self.__board_state__ = bytearray(width * height)
         self.__last_player_move__ = {player_1: Board.NOT_MOVED, player_2: Board.NOT_MOVED}
         self.__player_symbols__ = {Board.BLANK: Board.BLANK, player_1: 1, player_2: 2}
+        self.__undo_stack__ = []
+        self.__zobrist_keys__ = zobrist_keys(width, height)
+        self.__zobrist__ = 0
+        self.__geometry__ = board_geometry(width, height)
 
     @property
     def active_player(self):
@@ -69,6 +128,14 @@ class Board(object):
         """
         return self.__inactive_player__
 
+    @property
+    def geometry(self):
+        """
+        The `isolation.Geometry` lookup tables of the knight moves on this
+        board, shared by every board of the same size.
+        """
+        return self.__geometry__
+
     def get_opponent(self, player):
         """
         Return the opponent of the supplied player.
@@ -93,14 +160,27 @@ class Board(object):
 
     def copy(self):
         """ Return a deep copy of the current board. """
-        new_board = Board(self.__player_1__, self.__player_2__, width=self.width, height=self.height)
+        new_board = Board.__new__(Board)
+        self.__copy_to__(new_board)
+        new_board.__board_state__ = self.__board_state__[:]
+        return new_board
+
+    def __copy_to__(self, new_board):
+        """ Copy the state shared by every board engine into a board created
+        without calling `__init__`; the caller copies `__board_state__`. """
+        new_board.width = self.width
+        new_board.height = self.height
         new_board.move_count = self.move_count
+        new_board.__player_1__ = self.__player_1__
+        new_board.__player_2__ = self.__player_2__
         new_board.__active_player__ = self.__active_player__
         new_board.__inactive_player__ = self.__inactive_player__
-        new_board.__last_player_move__ = copy(self.__last_player_move__)
-        new_board.__player_symbols__ = copy(self.__player_symbols__)
-        new_board.__board_state__ = deepcopy(self.__board_state__)
-        return new_board
+        new_board.__last_player_move__ = self.__last_player_move__.copy()
+        new_board.__player_symbols__ = self.__player_symbols__
+        new_board.__undo_stack__ = self.__undo_stack__[:]
+        new_board.__zobrist_keys__ = self.__zobrist_keys__
+        new_board.__zobrist__ = self.__zobrist__
+        new_board.__geometry__ = self.__geometry__
 
     def forecast_move(self, move):
         """
@@ -140,14 +220,16 @@ class Board(object):
         row, col = move
         return 0 <= row < self.height and \
                0 <= col < self.width and \
-               self.__board_state__[row][col] == Board.BLANK
+               self.__board_state__[row * self.width + col] == Board.BLANK
 
     def get_blank_spaces(self):
         """
         Return a list of the locations that are still available on the board.
         """
-        return [(i, j) for j in range(self.width) for i in range(self.height)
-            if self.__board_state__[i][j] == Board.BLANK]
+        state = self.__board_state__
+        squares = self.__geometry__.squares
+        return [squares[i] for i in self.__geometry__.column_order
+            if state[i] == Board.BLANK]
 
     def get_player_location(self, player):
         """
@@ -200,18 +282,139 @@ class Board(object):
         None
         """
         row, col = move
+        self.__update_hash__(move)
         self.__last_player_move__[self.active_player] = move
-        self.__board_state__[row][col] = self.__player_symbols__[self.active_player]
+        self.__board_state__[row * self.width + col] = self.__player_symbols__[self.active_player]
         self.__active_player__, self.__inactive_player__ = self.__inactive_player__, self.__active_player__
         self.move_count += 1
 
+    def push_move(self, move):
+        """
+        Move the active player to a specified location in place, recording
+        the information needed to take the move back with `pop_move()`.
+
+        Unlike `forecast_move()` this does not copy the board, so search
+        algorithms can walk the game tree on a single board instance by
+        pairing every call to `push_move()` with a call to `pop_move()`.
+
+        Parameters
+        ----------
+        move : (int, int)
+            A coordinate pair (row, column) indicating the next position for
+            the active player on the board.
+
+        Returns
+        ----------
+        None
+        """
+        self.__undo_stack__.append((self.__last_player_move__[self.__active_player__],
+                                    self.__zobrist__))
+        self.apply_move(move)
+
+    def pop_move(self):
+        """
+        Take back the last move applied with `push_move()`, restoring the
+        board to the state it had before that move.
+
+        Returns
+        ----------
+        (int, int)
+            The coordinate pair (row, column) of the move taken back.
+        """
+        player = self.__inactive_player__
+        move = self.__last_player_move__[player]
+        self.__last_player_move__[player], self.__zobrist__ = self.__undo_stack__.pop()
+        self.__clear_cell__(move)
+        self.__active_player__, self.__inactive_player__ = player, self.__active_player__
+        self.move_count -= 1
+        return move
+
+    @property
+    def hash(self):
+        """
+        The 64-bit Zobrist key of the current position. The key covers the
+        blocked cells, the location of both players and the player to move,
+        and it is updated incrementally by every move so reading it is O(1).
+        """
+        return self.__zobrist__
+
+    def __update_hash__(self, move):
+        """ Update the Zobrist key for the active player moving to the
+        specified location. """
+        keys = self.__zobrist_keys__
+        location = keys.location[self.__player_symbols__[self.__active_player__]]
+        square = move[0] * self.width + move[1]
+        zobrist = self.__zobrist__ ^ keys.blocked[square] ^ location[square] ^ keys.side
+        prev = self.__last_player_move__[self.__active_player__]
+        if prev != Board.NOT_MOVED:
+            zobrist ^= location[prev[0] * self.width + prev[1]]
+        self.__zobrist__ = zobrist
+
+    def __clear_cell__(self, move):
+        """ Mark the cell at the specified location as blank. """
+        row, col = move
+        self.__board_state__[row * self.width + col] = Board.BLANK
+
     def is_winner(self, player):
         """ Test whether the specified player has won the game. """
-        return player == self.inactive_player and not self.get_legal_moves(self.active_player)
+        return player == self.inactive_player and \
+            not self.__count_moves__(self.__last_player_move__[self.active_player])
 
     def is_loser(self, player):
         """ Test whether the specified player has lost the game. """
-        return player == self.active_player and not self.get_legal_moves(self.active_player)
+        return player == self.active_player and \
+            not self.__count_moves__(self.__last_player_move__[self.active_player])
+
+    def mobility(self, player):
+        """
+        Count the legal moves of the specified player and of its opponent,
+        and evaluate whether the game is over, in a single pass. Heuristics
+        should use this instead of separate calls to `is_loser()`,
+        `is_winner()` and `get_legal_moves()`.
+
+        Parameters
+        ----------
+        player : object
+            An object registered as a player in the current game.
+
+        Returns
+        ----------
+        (int, int, float)
+            The number of legal moves of the player, the number of legal
+            moves of its opponent, and the utility of the current game state
+            for the player (see `Board.utility()`): +inf if the player has
+            won, -inf if the player has lost, and 0 otherwise.
+        """
+        opponent = self.get_opponent(player)
+        own_moves = self.__count_moves__(self.__last_player_move__[player])
+        opp_moves = self.__count_moves__(self.__last_player_move__[opponent])
+
+        if player == self.__active_player__:
+            if not own_moves:
+                return own_moves, opp_moves, float("-inf")
+        elif not opp_moves:
+            return own_moves, opp_moves, float("inf")
+
+        return own_moves, opp_moves, 0.
+
+    def blank_mask(self):
+        """
+        Return the blank squares of the board as a bitmask, with bit
+        `row * width + col` set for every blank square (the layout of the
+        masks of `Geometry.attacks`).
+        """
+        # read the cells as the binary digits of the mask, last cell first
+        digits = self.__board_state__.translate(Board.__blank_digits__)
+        return int(digits[::-1], 2)
+
+    def __count_moves__(self, loc):
+        """ Count the legal moves of a player standing at the specified
+        location. """
+        state = self.__board_state__
+        if loc == Board.NOT_MOVED:
+            return state.count(Board.BLANK)
+        neighbours = self.__geometry__.neighbours[loc[0] * self.width + loc[1]]
+        return [state[i] for i in neighbours].count(Board.BLANK)
 
     def utility(self, player):
         """
@@ -237,7 +440,7 @@ class Board(object):
             otherwise.
         """
 
-        if not self.get_legal_moves(self.active_player):
+        if not self.__count_moves__(self.__last_player_move__[self.active_player]):
 
             if player == self.inactive_player:
                 return float("inf")
@@ -256,14 +459,12 @@ class Board(object):
         if move == Board.NOT_MOVED:
             return self.get_blank_spaces()
 
-        r, c = move
-
-        directions = [(-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                      (1, -2),  (1, 2), (2, -1),  (2, 1)]
+        geometry = self.__geometry__
+        state = self.__board_state__
+        squares = geometry.squares
 
-        valid_moves = [(r+dr,c+dc) for dr, dc in directions if self.move_is_legal((r+dr, c+dc))]
-
-        return valid_moves
+        return [squares[i] for i in geometry.neighbours[move[0] * self.width + move[1]]
+                if state[i] == Board.BLANK]
 
     def print_board(self):
         """DEPRECATED - use Board.to_string()"""
@@ -285,7 +486,7 @@ class Board(object):
 
             for j in range(self.width):
 
-                if not self.__board_state__[i][j]:
+                if not self.__board_state__[i * self.width + j]:
                     out += ' '
                 elif p1_loc and i == p1_loc[0] and j == p1_loc[1]:
                     out += '1'
@@ -299,7 +500,8 @@ class Board(object):
 
         return out
 
-    def play(self, time_limit=TIME_LIMIT_MILLIS):
+    def play(self, time_limit=TIME_LIMIT_MILLIS, clock="wall", move_times=None,
+             move_nodes=None):
         """
         Execute a match between the players by alternately soliciting them
         to select a move and applying it in the game.
@@ -308,7 +510,28 @@ class Board(object):
         ----------
         time_limit : numeric (optional)
             The maximum number of milliseconds to allow before timeout
-            during each turn.
+            during each turn. Each player receives an `isolation.Deadline`
+            for its turn as the `time_left` argument of get_move(); it can be
+            called like a function to get the number of milliseconds left.
+
+        clock : {"wall", "thread", "process"} (optional)
+            The clock the time limit is measured on: elapsed wall-clock time,
+            or the CPU time used by the current thread or process (see
+            `isolation.deadline.CLOCKS`).
+
+        move_times : list (optional)
+            If given, a (wall-clock milliseconds, CPU milliseconds) pair is
+            appended for every move requested from the players, in order,
+            whichever clock is used for the time limit. The CPU time is that
+            of the process with the "process" clock, and that of the current
+            thread otherwise, so with a CPU clock it is the time that was
+            budgeted.
+
+        move_nodes : list (optional)
+            If given, the `nodes` attribute of the active player (the number
+            of positions its last search visited) is appended after every
+            move requested from the players, or None if it has no such
+            attribute.
 
         Returns
         ----------
@@ -318,8 +541,7 @@ class Board(object):
             (e.g., timeout or invalid move).
         """
         move_history = []
-
-        curr_time_millis = lambda: 1000 * timeit.default_timer()
+        cpu_clock = CLOCKS["process" if clock == "process" else "thread"]
 
         while True:
 
@@ -327,11 +549,19 @@ class Board(object):
 
             game_copy = self.copy()
 
-            move_start = curr_time_millis()
-            time_left = lambda : time_limit - (curr_time_millis() - move_start)
+            wall_start = time.perf_counter_ns()
+            cpu_start = cpu_clock()
+            time_left = Deadline(time_limit, clock=clock)
             curr_move = self.active_player.get_move(game_copy, legal_player_moves, time_left)
             move_end = time_left()
 
+            if move_times is not None:
+                move_times.append(((time.perf_counter_ns() - wall_start) / 1e6,
+                                   (cpu_clock() - cpu_start) / 1e6))
+
+            if move_nodes is not None:
+                move_nodes.append(getattr(self.active_player, "nodes", None))
+
             # print move_end
 
             if curr_move is None:
@@ -0,0 +1,214 @@
+"""
+This file contains the symmetries of the board: the reflections and rotations
+that map the knight moves of a board geometry onto themselves. A square board
+has the eight symmetries of the square, and a rectangular board the four that
+do not exchange rows and columns. Two positions related by a symmetry have the
+same value and mirrored best moves.
+
+Each symmetry is a permutation of the square indices `row * width + col` used
+by `isolation.geometry`.
+
+A position is the bitmask of the blocked squares and the square indices of
+the player to move and of its opponent (-1 for a player that has not moved
+yet). `canonical_position()` maps a position to its canonical representative,
+the smallest of its images under the symmetries, so that tables keyed on
+canonical positions (tablebases, opening books) store symmetric positions
+once; the symmetry it returns maps the moves of the position to the moves of
+the representative and back.
+"""
+
+from collections import namedtuple
+
+
+SymmetryTables = namedtuple("SymmetryTables", ["permutations", "inverses",
+                                               "images", "mask_tables"])
+
+_SYMMETRIES = {}
+_TABLES = {}
+
+
+def board_symmetries(width, height):
+    """
+    Return the symmetries of a board geometry, building them on first use.
+
+    Parameters
+    ----------
+    width : int
+        The number of columns of the board.
+
+    height : int
+        The number of rows of the board.
+
+    Returns
+    ----------
+    tuple<tuple<int>>
+        One permutation per symmetry, where `permutation[i]` is the index of
+        the square that square i is mapped to. The first permutation is the
+        identity.
+    """
+    symmetries = _SYMMETRIES.get((width, height))
+    if symmetries is not None:
+        return symmetries
+
+    permutations = []
+    for transpose in ((False, True) if width == height else (False,)):
+        for flip_rows in (False, True):
+            for flip_cols in (False, True):
+                permutation = []
+                for r in range(height):
+                    for c in range(width):
+                        row, col = (c, r) if transpose else (r, c)
+                        if flip_rows:
+                            row = height - 1 - row
+                        if flip_cols:
+                            col = width - 1 - col
+                        permutation.append(row * width + col)
+                permutations.append(tuple(permutation))
+
+    symmetries = tuple(permutations)
+    _SYMMETRIES[(width, height)] = symmetries
+    return symmetries
+
+
+def symmetry_tables(width, height):
+    """
+    Return the lookup tables applying the symmetries of a board geometry to
+    positions, building them on first use.
+
+    Returns
+    ----------
+    SymmetryTables
+        `permutations` are the symmetries of `board_symmetries()` and
+        `inverses` their inverse permutations. `images[s]` is the
+        permutation of symmetry s followed by -1, so that
+        `images[s][square]` also maps -1 (a player that has not moved) to
+        itself. `mask_tables[s]` holds one table per byte of a bitmask of
+        squares, mapping the value of the byte to the bitmask of the images
+        of its squares.
+    """
+    tables = _TABLES.get((width, height))
+    if tables is not None:
+        return tables
+
+    size = width * height
+    permutations = board_symmetries(width, height)
+    inverses = []
+    mask_tables = []
+    for permutation in permutations:
+        inverse = [0] * size
+        for square, image in enumerate(permutation):
+            inverse[image] = square
+        inverses.append(tuple(inverse))
+        byte_tables = []
+        for first in range(0, size, 8):
+            byte_table = []
+            for byte in range(256):
+                mask = 0
+                for bit in range(min(8, size - first)):
+                    if byte >> bit & 1:
+                        mask |= 1 << permutation[first + bit]
+                byte_table.append(mask)
+            byte_tables.append(tuple(byte_table))
+        mask_tables.append(tuple(byte_tables))
+
+    tables = SymmetryTables(permutations, tuple(inverses),
+                            tuple(p + (-1,) for p in permutations),
+                            tuple(mask_tables))
+    _TABLES[(width, height)] = tables
+    return tables
+
+
+def permute_mask(tables, symmetry, mask):
+    """
+    Return the bitmask of the images of the squares of a bitmask under the
+    symmetry of index `symmetry` (see `symmetry_tables()`).
+    """
+    image = 0
+    for byte_table in tables.mask_tables[symmetry]:
+        image |= byte_table[mask & 0xFF]
+        mask >>= 8
+    return image
+
+
+def canonical_position(tables, blocked, own, opp):
+    """
+    Return the canonical representative of a position: its image with the
+    smallest (blocked, own, opp) tuple under the symmetries of the board.
+
+    Parameters
+    ----------
+    tables : SymmetryTables
+        The tables of the board geometry (see `symmetry_tables()`).
+
+    blocked : int
+        The bitmask of the blocked squares.
+
+    own, opp : int
+        The square indices of the player to move and of its opponent, or -1
+        for a player that has not moved yet.
+
+    Returns
+    ----------
+    ((int, int, int), int)
+        The canonical (blocked, own, opp) position and the index of the
+        symmetry mapping the position to it. A move to square i in the
+        position is the move to square `tables.permutations[symmetry][i]` in
+        the canonical position, and a move to square j in the canonical
+        position is the move to `tables.inverses[symmetry][j]` here.
+    """
+    best, best_symmetry = None, 0
+    for symmetry, byte_tables in enumerate(tables.mask_tables):
+        mask = 0
+        bits = blocked
+        for byte_table in byte_tables:
+            mask |= byte_table[bits & 0xFF]
+            bits >>= 8
+        images = tables.images[symmetry]
+        position = (mask, images[own], images[opp])
+        if best is None or position < best:
+            best, best_symmetry = position, symmetry
+    return best, best_symmetry
+
+
+def game_position(game):
+    """
+    Return the (blocked, own, opp) position of a game, from the point of view
+    of its active player (see `canonical_position()`).
+    """
+    width = game.width
+    blocked = ~game.blank_mask() & ((1 << (width * game.height)) - 1)
+    locations = []
+    for player in (game.active_player, game.inactive_player):
+        location = game.get_player_location(player)
+        locations.append(-1 if location is None
+                         else location[0] * width + location[1])
+    return blocked, locations[0], locations[1]
+
+
+def distinct_moves(game, moves):
+    """
+    Return the moves of a game that lead to positions that are not symmetric
+    to each other: one move (the first in `moves`) per class of moves mapped
+    onto each other by the symmetries that fix the position of the game.
+
+    Only the first plies of a game have symmetries fixing their position:
+    every symmetry fixes the empty board, and after the first move only
+    those that fix its square do.
+    """
+    tables = symmetry_tables(game.width, game.height)
+    position = game_position(game)
+    blocked, own, opp = position
+    stabiliser = [images for symmetry, images in enumerate(tables.images)
+                  if (permute_mask(tables, symmetry, blocked),
+                      images[own], images[opp]) == position]
+    if len(stabiliser) == 1:
+        return moves
+    width = game.width
+    distinct = []
+    seen = set()
+    for move in moves:
+        square = move[0] * width + move[1]
+        if square not in seen:
+            distinct.append(move)
+            seen.update(images[square] for images in stabiliser)
+    return distinct
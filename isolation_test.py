@@ -0,0 +1,413 @@
+"""
+This file contains test cases for the board engines in the `isolation`
+package. Every engine must behave exactly like the reference `Board`
+implementation, so most tests replay the same random games on both and
+compare the observable state after every ply.
+"""
+import random
+import threading
+import time
+import unittest
+
+import isolation
+
+from isolation.endgame import partition, solve
+from isolation.symmetry import game_position, permute_mask
+from sample_players import GreedyPlayer
+
+
+def random_game(board_cls, seed, w=7, h=7):
+    """Play a random game on a board of the given class and return the
+    sequence of (legal moves, board string) pairs observed after every ply.
+    """
+    rng = random.Random(seed)
+    board = board_cls("Player1", "Player2", w, h)
+    trace = []
+    while True:
+        moves = board.get_legal_moves()
+        trace.append((moves, board.to_string(), board.utility("Player1")))
+        if not moves:
+            return trace
+        board.apply_move(rng.choice(moves))
+
+
+def random_game_board(board_cls, seed, num_moves, w=7, h=7):
+    """Return a board of the given class after a number of random moves."""
+    rng = random.Random(seed)
+    board = board_cls("Player1", "Player2", w, h)
+    for _ in range(num_moves):
+        board.apply_move(rng.choice(board.get_legal_moves()))
+    return board
+
+
+class BitBoardTest(unittest.TestCase):
+
+    def test_matches_board(self):
+        """ BitBoard generates the same moves and states as Board """
+        for seed in range(20):
+            for w, h in [(7, 7), (5, 8), (9, 4)]:
+                expected = random_game(isolation.Board, seed, w, h)
+                actual = random_game(isolation.BitBoard, seed, w, h)
+                self.assertEqual(expected, actual)
+
+    def test_forecast_move_does_not_modify_board(self):
+        """ BitBoard.forecast_move returns an independent copy """
+        board = isolation.BitBoard("Player1", "Player2")
+        board.apply_move((2, 3))
+        board.apply_move((0, 5))
+        before = board.to_string()
+        new_board = board.forecast_move((1, 1))
+        self.assertEqual(before, board.to_string())
+        self.assertNotEqual(before, new_board.to_string())
+        self.assertEqual(new_board.get_player_location("Player1"), (1, 1))
+        self.assertEqual(board.get_player_location("Player1"), (2, 3))
+        self.assertEqual(board.active_player, "Player1")
+        self.assertEqual(new_board.active_player, "Player2")
+
+
+class CopyTest(unittest.TestCase):
+
+    def test_copy_is_independent(self):
+        """ Moves applied to a copy do not affect the original board """
+        for board_cls in (isolation.Board, isolation.BitBoard):
+            board = random_game_board(board_cls, 0, 6)
+            before = board.to_string(), board.get_legal_moves(), board.hash
+            new_board = board.copy()
+            self.assertEqual(type(new_board), board_cls)
+            self.assertEqual(new_board.to_string(), board.to_string())
+            new_board.push_move(new_board.get_legal_moves()[0])
+            self.assertEqual(before, (board.to_string(), board.get_legal_moves(), board.hash))
+
+    def test_slots(self):
+        """ Boards do not carry a per-instance attribute dictionary """
+        for board_cls in (isolation.Board, isolation.BitBoard):
+            self.assertFalse(hasattr(board_cls("Player1", "Player2"), "__dict__"))
+
+
+class GeometryTest(unittest.TestCase):
+
+    def test_shared_tables(self):
+        """ Boards of the same size share one geometry and return interned
+        coordinate pairs """
+        geometry = isolation.board_geometry(7, 7)
+        for board_cls in (isolation.Board, isolation.BitBoard):
+            board = random_game_board(board_cls, 3, 4)
+            self.assertIs(board.geometry, geometry)
+            for move in board.get_legal_moves() + board.get_blank_spaces():
+                self.assertIs(move, geometry.squares[move[0] * 7 + move[1]])
+        self.assertIsNot(isolation.board_geometry(7, 5), geometry)
+
+    def test_neighbours(self):
+        """ Neighbour tables list the knight moves that stay on the board """
+        geometry = isolation.board_geometry(5, 4)
+        self.assertEqual(geometry.neighbour_squares[0], ((1, 2), (2, 1)))
+        self.assertEqual(geometry.neighbours[0], (7, 11))
+        self.assertEqual(geometry.attacks[0], (1 << 7) | (1 << 11))
+
+
+def legal_squares(geometry, blocked, location):
+    """Return the square indices a player on the square `location` (-1 if it
+    has not moved) can move to."""
+    squares = range(len(geometry.squares)) if location < 0 else geometry.neighbours[location]
+    return [i for i in squares if not blocked >> i & 1]
+
+
+class SymmetryTest(unittest.TestCase):
+
+    def test_symmetries_preserve_knight_moves(self):
+        """ Every symmetry maps the knight moves of a square onto the knight
+        moves of its image """
+        for (w, h), count in (((7, 7), 8), ((6, 4), 4)):
+            geometry = isolation.board_geometry(w, h)
+            symmetries = isolation.board_symmetries(w, h)
+            self.assertEqual(len(set(symmetries)), count)
+            self.assertEqual(symmetries[0], tuple(range(w * h)))
+            for p in symmetries:
+                self.assertEqual(sorted(p), list(range(w * h)))
+                for i, neighbours in enumerate(geometry.neighbours):
+                    self.assertEqual(sorted(p[j] for j in neighbours),
+                                     sorted(geometry.neighbours[p[i]]))
+
+    def test_canonical_position(self):
+        """ Symmetric positions have the same canonical representative, and
+        the returned symmetry maps the moves of a position to the moves of
+        the representative and back """
+        for w, h in ((7, 7), (6, 4)):
+            geometry = isolation.board_geometry(w, h)
+            tables = isolation.symmetry_tables(w, h)
+            for seed in range(10):
+                board = random_game_board(isolation.BitBoard, seed, seed % 6, w, h)
+                blocked, own, opp = position = game_position(board)
+                canonical, symmetry = isolation.canonical_position(tables, *position)
+                for s in range(len(tables.permutations)):
+                    image = (permute_mask(tables, s, blocked),
+                             tables.images[s][own], tables.images[s][opp])
+                    self.assertLessEqual(canonical, image)
+                    self.assertEqual(isolation.canonical_position(tables, *image)[0],
+                                     canonical)
+                p = tables.permutations[symmetry]
+                self.assertEqual(canonical[0], permute_mask(tables, symmetry, blocked))
+                moves = legal_squares(geometry, blocked, own)
+                canonical_moves = legal_squares(geometry, canonical[0], canonical[1])
+                self.assertEqual(sorted(p[i] for i in moves), sorted(canonical_moves))
+                self.assertEqual(sorted(tables.inverses[symmetry][i]
+                                        for i in canonical_moves), moves)
+
+
+def active_wins(board):
+    """Solve a game by exhaustive minimax search over board copies and
+    return True if the active player wins."""
+    return not all(active_wins(board.forecast_move(move))
+                   for move in board.get_legal_moves())
+
+
+def partitioned_positions(board_cls, w, h, seeds, max_blank=14):
+    """Yield the positions of random games where the players are
+    partitioned and at most `max_blank` squares are blank."""
+    for seed in seeds:
+        rng = random.Random(seed)
+        board = board_cls("Player1", "Player2", w, h)
+        while board.get_legal_moves():
+            if len(board.get_blank_spaces()) <= max_blank and partition(board):
+                yield board
+            board.apply_move(rng.choice(board.get_legal_moves()))
+
+
+class EndgameTest(unittest.TestCase):
+
+    def test_blank_mask(self):
+        """ blank_mask() has the bits of the blank squares set """
+        for board_cls in (isolation.Board, isolation.BitBoard):
+            board = random_game_board(board_cls, 2, 9, 6, 5)
+            self.assertEqual(board.blank_mask(),
+                             sum(1 << (r * 6 + c) for r, c in board.get_blank_spaces()))
+
+    def test_partition(self):
+        """ The players are partitioned when the sets of blank squares they
+        can reach with any number of moves are disjoint """
+        def reach(board, loc):
+            seen, frontier = set(), [loc]
+            blank = set(board.get_blank_spaces())
+            geometry = board.geometry
+            while frontier:
+                r, c = frontier.pop()
+                for square in geometry.neighbour_squares[r * board.width + c]:
+                    if square in blank and square not in seen:
+                        seen.add(square)
+                        frontier.append(square)
+            return seen
+
+        partitioned = 0
+        for seed in range(10):
+            rng = random.Random(seed)
+            board = isolation.BitBoard("Player1", "Player2", 6, 6)
+            board.apply_move(rng.choice(board.get_legal_moves()))
+            self.assertIsNone(partition(board))
+            board.apply_move(rng.choice(board.get_legal_moves()))
+            while board.get_legal_moves():
+                own = reach(board, board.get_player_location(board.active_player))
+                opp = reach(board, board.get_player_location(board.inactive_player))
+                regions = partition(board)
+                self.assertEqual(regions is None, bool(own & opp))
+                if regions is not None:
+                    partitioned += 1
+                    self.assertEqual(regions[0], sum(1 << (r * 6 + c) for r, c in own))
+                    self.assertEqual(regions[1], sum(1 << (r * 6 + c) for r, c in opp))
+                board.apply_move(rng.choice(board.get_legal_moves()))
+        self.assertGreater(partitioned, 0)
+
+    def test_solve_matches_minimax(self):
+        """ The player with the longer path wins a partitioned game, and its
+        first move keeps the win """
+        count = 0
+        for board in partitioned_positions(isolation.BitBoard, 5, 5, range(30)):
+            own_length, opp_length, move = solve(board)
+            wins = active_wins(board)
+            self.assertEqual(own_length > opp_length, wins)
+            if wins:
+                self.assertFalse(active_wins(board.forecast_move(move)))
+            count += 1
+        self.assertGreater(count, 10)
+
+
+class MobilityTest(unittest.TestCase):
+
+    def test_mobility(self):
+        """ Board.mobility agrees with is_loser, is_winner and the number of
+        legal moves of both players """
+        for board_cls in (isolation.Board, isolation.BitBoard):
+            for seed in range(10):
+                rng = random.Random(seed)
+                board = board_cls("Player1", "Player2")
+                while True:
+                    for player in ("Player1", "Player2"):
+                        opponent = board.get_opponent(player)
+                        expected_utility = 0.
+                        if board.is_loser(player):
+                            expected_utility = float("-inf")
+                        elif board.is_winner(player):
+                            expected_utility = float("inf")
+                        self.assertEqual(board.mobility(player),
+                                         (len(board.get_legal_moves(player)),
+                                          len(board.get_legal_moves(opponent)),
+                                          expected_utility))
+                        self.assertEqual(board.utility(player), expected_utility)
+                    if not board.get_legal_moves():
+                        break
+                    board.apply_move(rng.choice(board.get_legal_moves()))
+
+
+class PushPopTest(unittest.TestCase):
+
+    def check_push_pop(self, board_cls):
+        rng = random.Random(0)
+        board = board_cls("Player1", "Player2")
+        snapshots = []
+        while board.get_legal_moves():
+            snapshots.append((board.to_string(), board.move_count,
+                              board.active_player, board.get_legal_moves(),
+                              board.get_legal_moves(board.inactive_player)))
+            board.push_move(rng.choice(board.get_legal_moves()))
+        while snapshots:
+            board.pop_move()
+            self.assertEqual(snapshots.pop(),
+                             (board.to_string(), board.move_count,
+                              board.active_player, board.get_legal_moves(),
+                              board.get_legal_moves(board.inactive_player)))
+
+    def test_board_push_pop(self):
+        """ Board.pop_move restores the state before each push_move """
+        self.check_push_pop(isolation.Board)
+
+    def test_bitboard_push_pop(self):
+        """ BitBoard.pop_move restores the state before each push_move """
+        self.check_push_pop(isolation.BitBoard)
+
+
+def zobrist_from_scratch(board):
+    """Compute the Zobrist key of a board by XOR-ing the key of every
+    feature of the position, independently of the incremental updates.
+    """
+    keys = isolation.isolation.zobrist_keys(board.width, board.height)
+    occupied = set(
+        (r, c) for r in range(board.height) for c in range(board.width)) - \
+        set(board.get_blank_spaces())
+    zobrist = 0
+    for r, c in occupied:
+        zobrist ^= keys.blocked[r * board.width + c]
+    for symbol, player in enumerate(("Player1", "Player2"), 1):
+        loc = board.get_player_location(player)
+        if loc is not None:
+            zobrist ^= keys.location[symbol][loc[0] * board.width + loc[1]]
+    if board.active_player == "Player2":
+        zobrist ^= keys.side
+    return zobrist
+
+
+class ZobristTest(unittest.TestCase):
+
+    def test_incremental_hash(self):
+        """ Board.hash matches the key computed from scratch at every ply and
+        is restored by pop_move """
+        for board_cls in (isolation.Board, isolation.BitBoard):
+            rng = random.Random(1)
+            board = board_cls("Player1", "Player2")
+            hashes = []
+            while board.get_legal_moves():
+                self.assertEqual(board.hash, zobrist_from_scratch(board))
+                self.assertEqual(board.hash, board.copy().hash)
+                hashes.append(board.hash)
+                board.push_move(rng.choice(board.get_legal_moves()))
+            while hashes:
+                board.pop_move()
+                self.assertEqual(board.hash, hashes.pop())
+
+
+class FakeClock(object):
+    """Nanosecond clock that only advances when told to."""
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class DeadlineTest(unittest.TestCase):
+
+    def test_legacy_callable(self):
+        """ A Deadline returns the milliseconds left when called """
+        clock = FakeClock()
+        deadline = isolation.Deadline(150, clock=clock)
+        clock.now = 40 * 10**6
+        self.assertEqual(deadline(), 110)
+        self.assertEqual(deadline.with_margin(10)(), 100)
+
+    def test_amortised_checks(self):
+        """ expired() reads the clock rarely but notices the deadline within
+        a few calls """
+        clock = FakeClock()
+        deadline = isolation.Deadline(100, check_every=4096, clock=clock)
+        calls = 0
+        while not deadline.expired():
+            clock.now += 1000  # each search node takes 1 microsecond
+            calls += 1
+        self.assertEqual(deadline.calls, calls + 1)
+        self.assertLess(deadline.clock_calls, 100)
+        self.assertLessEqual(deadline.latency, 0.002)
+        self.assertTrue(deadline.expired())
+
+    def test_slow_calls_after_fast_calls(self):
+        """ A deadline first called in quick succession still notices its
+        expiry in time when the calls become slow """
+        clock = FakeClock()
+        deadline = isolation.Deadline(100, check_every=4096, clock=clock)
+        deadline.expired()
+        while not deadline.expired():
+            clock.now += 100000  # each call takes 0.1 millisecond
+        self.assertLessEqual(deadline.latency, 0.2)
+
+
+class PlayTest(unittest.TestCase):
+
+    def test_cpu_clock_and_move_times(self):
+        """ Board.play accepts a CPU clock and reports the wall-clock and CPU
+        time of every move """
+        for clock in ("wall", "thread", "process"):
+            player1, player2 = GreedyPlayer(), GreedyPlayer()
+            board = isolation.Board(player1, player2)
+            board.apply_move((2, 3))
+            board.apply_move((0, 5))
+            move_times = []
+            _, history, termination = board.play(clock=clock, move_times=move_times)
+            self.assertEqual(termination, "illegal move")
+            self.assertEqual(len(move_times), sum(len(moves) for moves in history))
+            for wall, cpu in move_times:
+                self.assertGreaterEqual(wall, 0)
+                self.assertGreaterEqual(cpu, 0)
+
+    def test_move_times_use_the_budgeted_clock(self):
+        """ With the "process" clock the reported CPU time of a move includes
+        the time of the other threads of the process, like its deadline """
+        class HelperThreadPlayer(object):
+            """Player spending its turn waiting for a busy helper thread."""
+            def get_move(self, game, legal_moves, time_left):
+                def spin():
+                    end = time.process_time() + 0.03
+                    while time.process_time() < end:
+                        pass
+                helper = threading.Thread(target=spin)
+                helper.start()
+                helper.join()
+                return (-1, -1)
+
+        for clock, busy in (("thread", False), ("process", True)):
+            board = isolation.Board(HelperThreadPlayer(), GreedyPlayer())
+            move_times = []
+            board.play(clock=clock, move_times=move_times)
+            (_, cpu), = move_times
+            self.assertEqual(cpu >= 20, busy)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,289 @@
+"""This file contains a Monte Carlo tree search player.
+
+`MCTSPlayer` grows a UCT search tree for as long as the turn allows and plays
+the most visited move. Every iteration ends with a random playout, run on a
+lightweight copy of the position -- a bitmask of the blocked squares and the
+square indices of the two players -- instead of `Board` objects, so the number
+of playouts per second is limited by the random move generation alone.
+"""
+import math
+import random
+import time
+
+from isolation import Deadline
+
+
+# Default exploration constant of the UCT selection rule
+UCT_C = math.sqrt(2)
+
+
+class Node(object):
+    """A node of the search tree.
+
+    Parameters
+    ----------
+    move : int
+        The square index of the move leading to the node (-1 for the root)
+
+    untried : list<int>
+        The moves of the player to move that have no child node yet
+
+    Attributes
+    ----------
+    visits : int
+        The number of playouts that went through the node
+
+    wins : float
+        The number of those playouts won by the player that made `move`
+
+    Nodes do not reference their parent, so that the tree holds no reference
+    cycles and is freed as soon as its root is dropped, without waiting for
+    the garbage collector.
+    """
+    __slots__ = ('move', 'children', 'untried', 'visits', 'wins')
+
+    def __init__(self, move, untried):
+        self.move = move
+        self.children = []
+        self.untried = untried
+        self.visits = 0
+        self.wins = 0.
+
+
+class MCTSPlayer(object):
+    """Game-playing agent using Monte Carlo tree search with the UCT selection
+    rule and uniformly random playouts.
+
+    Parameters
+    ----------
+    exploration : float (optional)
+        The exploration constant of the UCT rule; larger values spread the
+        playouts more evenly between the moves.
+
+    timeout : float (optional)
+        Time remaining (in milliseconds) when search is aborted. Should be a
+        positive value large enough to allow the function to return before the
+        timer expires.
+
+    seed : int (optional)
+        Seed of the random generator used for the playouts; the generator is
+        seeded from the system if None.
+
+    reuse : bool (optional)
+        Flag indicating whether the search tree is kept between moves. The
+        next call to `get_move()` then starts from the subtree of the reply
+        the opponent played, if the tree has one, and the rest of the tree is
+        freed.
+
+    Attributes
+    ----------
+    playouts : int
+        The number of playouts run by the last call to `get_move()`
+
+    playouts_per_second : float
+        The rate of those playouts
+
+    reused : int
+        The number of playouts inherited from the tree of the previous move
+        by the last call to `get_move()`
+    """
+    def __init__(self, exploration=UCT_C, timeout=10., seed=None, reuse=True):
+        self.exploration = exploration
+        self.TIMER_THRESHOLD = timeout
+        self.rng = random.Random(seed)
+        self.reuse = reuse
+        self.playouts = 0
+        self.playouts_per_second = 0.
+        self.reused = 0
+        # the subtree of the last move played and the position it starts from
+        self.tree = None
+        self.tree_position = None
+
+    @property
+    def nodes(self):
+        """ The number of playouts run by the last call to `get_move()`. """
+        return self.playouts
+
+    def get_move(self, game, legal_moves, time_left):
+        """Search for the best move from the available legal moves and return a
+        result before the time limit expires.
+
+        Parameters
+        ----------
+        game : `isolation.Board`
+            An instance of `isolation.Board` encoding the current state of the
+            game (e.g., player locations and blocked cells).
+
+        legal_moves : list<(int, int)>
+            A list containing legal moves. Moves are encoded as tuples of pairs
+            of ints defining the next (row, col) for the agent to occupy.
+
+        time_left : callable
+            A function that returns the number of milliseconds left in the
+            current turn. Returning with any less than 0 ms remaining forfeits
+            the game.
+
+        Returns
+        -------
+        (int, int)
+            Board coordinates corresponding to a legal move; may return
+            (-1, -1) if there are no available legal moves.
+        """
+        self.playouts = 0
+        self.playouts_per_second = 0.
+        self.reused = 0
+        tree, self.tree = self.tree, None
+        if not legal_moves:
+            return (-1, -1)
+
+        geometry = game.geometry
+        position = self.position(game)
+        blocked, own, opp = position
+        root = self.reply_subtree(tree, position)
+        if root is None:
+            root = Node(-1, self.legal_moves(geometry, blocked, own))
+        self.reused = root.visits
+
+        if len(legal_moves) == 1:
+            # nothing to search, but the subtree of the forced move is kept
+            move = legal_moves[0]
+            index = move[0] * game.width + move[1]
+            if self.reuse:
+                for child in root.children:
+                    if child.move == index:
+                        self.tree = child
+                        self.tree_position = (blocked | 1 << index, opp, index)
+            return move
+
+        if isinstance(time_left, Deadline):
+            expired = time_left.with_margin(self.TIMER_THRESHOLD).expired
+        else:
+            def expired():
+                return time_left() < self.TIMER_THRESHOLD
+
+        start = time.perf_counter()
+        while not expired():
+            self.search(geometry, root, blocked, own, opp)
+            self.playouts += 1
+        elapsed = time.perf_counter() - start
+        if elapsed > 0:
+            self.playouts_per_second = self.playouts / elapsed
+
+        if not root.children:
+            return legal_moves[0]
+        best = max(root.children, key=lambda child: child.visits)
+        if self.reuse:
+            self.tree = best
+            self.tree_position = (blocked | 1 << best.move, opp, best.move)
+        return geometry.squares[best.move]
+
+    def reply_subtree(self, tree, position):
+        """Return the subtree of the kept search tree that starts from the
+        given position, or None if there is none.
+
+        The kept tree starts right after the last move of this player. The
+        position can only be found in it if the player kept its location and
+        the opponent moved once, to the only square that became blocked; the
+        reply is then the child of the tree for that square.
+        """
+        if tree is None:
+            return None
+        blocked, own, opp = position
+        last_blocked, last_opp, last_own = self.tree_position
+        if own != last_own or opp < 0 or opp == last_opp or \
+                blocked != last_blocked | 1 << opp:
+            return None
+        for child in tree.children:
+            if child.move == opp:
+                return child
+        return None
+
+    @staticmethod
+    def position(game):
+        """Return the lightweight state of a game: the bitmask of its blocked
+        squares, and the square indices of the active and inactive players
+        (-1 for a player that has not moved yet).
+        """
+        width = game.width
+        blocked = (1 << (game.width * game.height)) - 1
+        for r, c in game.get_blank_spaces():
+            blocked ^= 1 << (r * width + c)
+        locations = []
+        for player in (game.active_player, game.inactive_player):
+            location = game.get_player_location(player)
+            locations.append(-1 if location is None
+                             else location[0] * width + location[1])
+        return blocked, locations[0], locations[1]
+
+    def legal_moves(self, geometry, blocked, location):
+        """Return the square indices a player on the square `location` can
+        move to, in random order.
+        """
+        if location < 0:
+            moves = [i for i in range(len(geometry.squares)) if not blocked >> i & 1]
+        else:
+            moves = [i for i in geometry.neighbours[location] if not blocked >> i & 1]
+        self.rng.shuffle(moves)
+        return moves
+
+    def search(self, geometry, root, blocked, own, opp):
+        """Run one iteration of the search from the root: select a leaf with
+        the UCT rule, expand one of its moves, run a random playout from the
+        new node and update the statistics of the nodes on its path.
+        """
+        node = root
+        path = [root]
+        c = self.exploration
+
+        # selection
+        while not node.untried and node.children:
+            log_visits = math.log(node.visits)
+            best, best_value = None, -1.
+            for child in node.children:
+                value = (child.wins / child.visits
+                         + c * math.sqrt(log_visits / child.visits))
+                if value > best_value:
+                    best, best_value = child, value
+            node = best
+            path.append(node)
+            blocked |= 1 << node.move
+            own, opp = opp, node.move
+
+        # expansion
+        if node.untried:
+            move = node.untried.pop()
+            blocked |= 1 << move
+            own, opp = opp, move
+            child = Node(move, self.legal_moves(geometry, blocked, own))
+            node.children.append(child)
+            node = child
+            path.append(node)
+
+        # the player that moved into the node wins if the player to move
+        # there loses the playout
+        win = 1. if self.playout(geometry, blocked, own, opp) else 0.
+
+        # backpropagation, alternating the point of view at every ply
+        for node in reversed(path):
+            node.visits += 1
+            node.wins += win
+            win = 1. - win
+
+    def playout(self, geometry, blocked, own, opp):
+        """Play random moves until a player cannot move, starting with the
+        player on the square `own`, and return True if that player loses.
+        """
+        neighbours = geometry.neighbours
+        choice = self.rng.choice
+        loses = True
+        while True:
+            if own < 0:
+                moves = self.legal_moves(geometry, blocked, own)
+            else:
+                moves = [i for i in neighbours[own] if not blocked >> i & 1]
+            if not moves:
+                return loses
+            move = choice(moves)
+            blocked |= 1 << move
+            own, opp = opp, move
+            loses = not loses
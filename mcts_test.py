@@ -0,0 +1,100 @@
+"""
+This file contains test cases for the Monte Carlo tree search player in
+mcts_agent.py.
+"""
+import random
+import unittest
+
+import isolation
+
+from mcts_agent import MCTSPlayer
+from sample_players import RandomPlayer
+
+
+def winning_position(seed):
+    """Return a board, reached by random moves, where the active player has
+    several legal moves and one of them leaves the opponent without moves.
+    """
+    rng = random.Random(seed)
+    while True:
+        board = isolation.Board(MCTSPlayer(seed=seed), RandomPlayer())
+        while board.get_legal_moves():
+            moves = board.get_legal_moves()
+            winning = [m for m in moves if not board.forecast_move(m).get_legal_moves()]
+            if board.active_player is board.__player_1__ and winning and \
+                    len(moves) > len(winning):
+                return board, winning
+            board.apply_move(rng.choice(moves))
+
+
+class MCTSPlayerTest(unittest.TestCase):
+
+    def test_position(self):
+        """ The lightweight state matches the board """
+        board = isolation.Board("Player1", "Player2", 5, 4)
+        board.apply_move((1, 2))
+        blocked, own, opp = MCTSPlayer.position(board)
+        self.assertEqual((blocked, own, opp), (1 << 7, -1, 7))
+        board.apply_move((3, 4))
+        blocked, own, opp = MCTSPlayer.position(board)
+        self.assertEqual((blocked, own, opp), (1 << 7 | 1 << 19, 7, 19))
+
+    def test_returns_legal_move_and_reports_playouts(self):
+        for num_moves in (0, 1, 2, 10):
+            board = isolation.Board(MCTSPlayer(seed=1), MCTSPlayer(seed=2))
+            rng = random.Random(num_moves)
+            for _ in range(num_moves):
+                board.apply_move(rng.choice(board.get_legal_moves()))
+            player = board.active_player
+            moves = board.get_legal_moves()
+            move = player.get_move(board.copy(), moves, isolation.Deadline(50))
+            self.assertIn(move, moves)
+            if len(moves) > 1:
+                self.assertGreater(player.playouts, 0)
+                self.assertGreater(player.playouts_per_second, 0)
+                self.assertEqual(player.nodes, player.playouts)
+
+    def test_finds_winning_move(self):
+        for seed in range(3):
+            board, winning = winning_position(seed)
+            move = board.active_player.get_move(board.copy(), board.get_legal_moves(),
+                                                isolation.Deadline(50))
+            self.assertIn(move, winning)
+
+    def test_tree_reuse(self):
+        """ The tree of the previous move is reused after the opponent's
+        reply, unless the position does not follow from it """
+        board = isolation.Board(MCTSPlayer(seed=3), MCTSPlayer(seed=4, reuse=False))
+        board.apply_move((3, 3))
+        board.apply_move((2, 4))
+        player = board.active_player
+        board.apply_move(player.get_move(board.copy(), board.get_legal_moves(),
+                                         isolation.Deadline(100)))
+        self.assertEqual(player.reused, 0)
+        # the most likely reply has been expanded in the kept tree
+        reply = max(player.tree.children, key=lambda child: child.visits)
+        expected = reply.visits
+        board.apply_move(board.geometry.squares[reply.move])
+        player.get_move(board.copy(), board.get_legal_moves(), isolation.Deadline(50))
+        self.assertEqual(player.reused, expected)
+        self.assertGreater(player.playouts, 0)
+
+        # a position that was not reached from the kept tree starts over
+        other = isolation.Board(player, RandomPlayer())
+        other.apply_move((0, 0))
+        other.apply_move((6, 6))
+        player.get_move(other.copy(), other.get_legal_moves(), isolation.Deadline(50))
+        self.assertEqual(player.reused, 0)
+
+        opponent = board.inactive_player
+        opponent.get_move(board.copy(), board.get_legal_moves(), isolation.Deadline(50))
+        self.assertIsNone(opponent.tree)
+
+    def test_no_legal_moves(self):
+        board = isolation.Board(MCTSPlayer(), RandomPlayer())
+        self.assertEqual(board.active_player.get_move(board, [], isolation.Deadline(50)),
+                         (-1, -1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,295 @@
+"""This file contains the opening books of `CustomPlayer`: files mapping the
+positions of the first plies of a game to the move found by a deep search,
+built offline from self-play games and probed with `mmap`.
+
+Positions are keyed on their canonical representative under the symmetries
+of the board (see `isolation.canonical_position()`), packed like the keys of
+the tablebases (see `tablebase.pack_position()`), so symmetric positions
+share one entry and the stored move is mapped back onto the position that
+is probed.
+
+A book file is a header, the sorted array of the 64-bit keys of its
+positions, and the array of their entries: the move (the canonical square
+index), the value and depth of the search that chose it, and the number of
+self-play games that reached the position. A probe is a binary search of the
+keys in the mapped file. Run this file to build the book of a board size:
+
+    python opening_book.py --size 7 7 --plies 4 --games 32 --time 1000
+"""
+
+import argparse
+import bisect
+import mmap
+import os
+import random
+import struct
+import time
+
+from array import array
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from isolation import Board, Deadline
+from isolation import canonical_position, distinct_moves, symmetry_tables
+from isolation.symmetry import game_position
+from tablebase import MAX_SQUARES, pack_position
+
+BOOK_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "books")
+
+# The header of a book file: magic string, board width and height, and the
+# number of positions; each position then has an ENTRY after the keys
+MAGIC = b"ISOLBK01"
+HEADER = struct.Struct("<8sIII")
+ENTRY = struct.Struct("<fIBB2x")
+
+BookEntry = namedtuple("BookEntry", ["move", "value", "depth", "visits"])
+
+
+class OpeningBook(object):
+    """A book file opened with `mmap`.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+    """
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.width, self.height, self.positions = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError("{} is not an opening book file".format(path))
+        self.keys = memoryview(self.map)[HEADER.size:HEADER.size + 8 * self.positions].cast("Q")
+        self.entries = HEADER.size + 8 * self.positions
+        self.tables = symmetry_tables(self.width, self.height)
+
+    def __len__(self):
+        return self.positions
+
+    def close(self):
+        """Close the file."""
+        if self.map is None:
+            return
+        self.keys.release()
+        self.map.close()
+        self.file.close()
+        self.map = None
+
+    def lookup(self, key):
+        """Return the (square, value, depth, visits) entry of a canonical key,
+        or None."""
+        index = bisect.bisect_left(self.keys, key)
+        if index == self.positions or self.keys[index] != key:
+            return None
+        value, visits, depth, square = ENTRY.unpack_from(
+            self.map, self.entries + index * ENTRY.size)
+        return square, value, depth, visits
+
+    def probe(self, game):
+        """Return the book entry of a game, with the move mapped onto the
+        game, or None if the game is not in the book."""
+        if (game.width, game.height) != (self.width, self.height):
+            return None
+        canonical, symmetry = canonical_position(self.tables, *game_position(game))
+        entry = self.lookup(pack_position(*canonical))
+        if entry is None:
+            return None
+        square, value, depth, visits = entry
+        square = self.tables.inverses[symmetry][square]
+        return BookEntry(divmod(square, self.width), value, depth, visits)
+
+
+def write_book(path, width, height, entries):
+    """Write a book file.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+
+    width, height : int
+        The size of the board.
+
+    entries : dict
+        Maps the canonical key of every position to its (square, value,
+        depth, visits) entry.
+    """
+    keys = sorted(entries)
+    with open(path, "wb") as book_file:
+        book_file.write(HEADER.pack(MAGIC, width, height, len(keys)))
+        book_file.write(array("Q", keys).tobytes())
+        for key in keys:
+            square, value, depth, visits = entries[key]
+            book_file.write(ENTRY.pack(value, visits, min(depth, 255), square))
+
+
+def book_path(width, height):
+    """Return the path of the opening book of a board size."""
+    return os.path.join(BOOK_FOLDER, "{}x{}.book".format(width, height))
+
+
+_BOOKS = {}
+
+
+def load_book(width, height):
+    """Return the opening book of a board size, opening it on first use, or
+    None if there is no book file for that size."""
+    if (width, height) not in _BOOKS:
+        path = book_path(width, height)
+        _BOOKS[(width, height)] = OpeningBook(path) if os.path.exists(path) else None
+    return _BOOKS[(width, height)]
+
+
+def play_book_game(width, height, plies, time_limit, explore, seed):
+    """Play the first plies of a self-play game and return the search result
+    of every position of the game (run by the workers of `build_book()`).
+
+    Every position is searched by an alpha-beta player with a fixed time
+    limit; the move played is the searched move, or, with probability
+    `explore`, a random move that is distinct under symmetry, so that the
+    games spread over the likely openings. A position whose search does not
+    complete an iteration in time is not recorded, and a random move is
+    played instead.
+
+    Returns
+    -------
+    list<(int, int, float, int)>
+        The canonical key, the canonical square of the searched move, and
+        the value and depth of the search of each position
+    """
+    # game_agent plays the book moves, so it is only imported here
+    import game_agent
+
+    rng = random.Random(seed)
+    tables = symmetry_tables(width, height)
+    players = [game_agent.CustomPlayer(method='alphabeta', inplace=True, tt_mb=8,
+                                       ordering=True, opening_search=True)
+               for _ in range(2)]
+    game = Board(players[0], players[1], width, height)
+    results = []
+    for _ in range(plies):
+        legal_moves = game.get_legal_moves()
+        if not legal_moves:
+            break
+        player = game.active_player
+        move = player.get_move(game, legal_moves, Deadline(time_limit))
+        # the move must come from a completed iteration of this search
+        if (move in legal_moves and player.iterations
+                and player.iterations[-1][2] == move):
+            depth, value, _ = player.iterations[-1]
+            canonical, symmetry = canonical_position(tables, *game_position(game))
+            square = tables.permutations[symmetry][move[0] * width + move[1]]
+            results.append((pack_position(*canonical), square, value, depth))
+        else:
+            move = None
+        if move is None or rng.random() < explore:
+            move = rng.choice(distinct_moves(game, legal_moves))
+        game.apply_move(move)
+    return results
+
+
+def merge_result(entries, key, square, value, depth):
+    """Add the search result of a position reached by a game to the book
+    entries: the visits are counted, and the deepest search is kept."""
+    entry = entries.get(key)
+    if entry is None:
+        entries[key] = (square, value, depth, 1)
+    elif depth > entry[2]:
+        entries[key] = (square, value, depth, entry[3] + 1)
+    else:
+        entries[key] = entry[:3] + (entry[3] + 1,)
+
+
+def build_book(width, height, path, plies=4, games=32, time_limit=1000,
+               explore=0.5, workers=1, seed=0):
+    """Build an opening book from self-play games and write it to a file.
+
+    Parameters
+    ----------
+    width, height : int
+        The size of the board.
+
+    path : str
+        The path of the book file to write.
+
+    plies : int (optional)
+        The number of plies of each self-play game.
+
+    games : int (optional)
+        The number of self-play games.
+
+    time_limit : float (optional)
+        The search time of every position, in milliseconds.
+
+    explore : float (optional)
+        The probability of playing a random move instead of the searched
+        move in the self-play games.
+
+    workers : int (optional)
+        The number of worker processes playing the games; 1 plays them in
+        the calling process.
+
+    seed : int (optional)
+        The seed of the random moves of the games.
+
+    Returns
+    -------
+    int
+        The number of positions in the book
+    """
+    if width * height > MAX_SQUARES:
+        raise ValueError("boards of more than {} squares are not supported"
+                         .format(MAX_SQUARES))
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(32) for _ in range(games)]
+    args = ([width] * games, [height] * games, [plies] * games,
+            [time_limit] * games, [explore] * games, seeds)
+    entries = {}
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as executor:
+            for results in executor.map(play_book_game, *args):
+                for result in results:
+                    merge_result(entries, *result)
+    else:
+        for results in map(play_book_game, *args):
+            for result in results:
+                merge_result(entries, *result)
+    write_book(path, width, height, entries)
+    return len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the opening book of a "
+                                                 "board size from self-play.")
+    parser.add_argument("--size", type=int, nargs=2, default=(7, 7),
+                        metavar=("WIDTH", "HEIGHT"),
+                        help="board size of the book (default: 7 7)")
+    parser.add_argument("--plies", type=int, default=4,
+                        help="number of plies of each self-play game")
+    parser.add_argument("--games", type=int, default=32,
+                        help="number of self-play games")
+    parser.add_argument("--time", type=float, default=1000,
+                        help="search time of every position, in milliseconds")
+    parser.add_argument("--explore", type=float, default=0.5,
+                        help="probability of playing a random move")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of worker processes")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the random moves")
+    parser.add_argument("--output", help="path of the book file "
+                                         "(default: books/WxH.book)")
+    args = parser.parse_args(argv)
+
+    width, height = args.size
+    path = args.output or book_path(width, height)
+    if not args.output:
+        os.makedirs(BOOK_FOLDER, exist_ok=True)
+    start = time.time()
+    positions = build_book(width, height, path, args.plies, args.games, args.time,
+                           args.explore, args.workers, args.seed)
+    print("{}x{}: {} positions written to {} ({:.0f}s)".format(
+        width, height, positions, path, time.time() - start))
+
+
+if __name__ == "__main__":
+    main()
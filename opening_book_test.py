@@ -0,0 +1,92 @@
+"""
+This file contains test cases for the opening books built by opening_book.py.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import game_agent
+import isolation
+import opening_book
+
+from isolation.symmetry import game_position
+from tablebase import pack_position
+
+
+class OpeningBookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def open_book(self, path):
+        book = opening_book.OpeningBook(path)
+        self.addCleanup(book.close)
+        return book
+
+    def test_symmetric_positions_share_entries(self):
+        """ A stored move is mapped onto every position symmetric to the
+        stored one """
+        tables = isolation.symmetry_tables(5, 5)
+        board = isolation.Board("Player1", "Player2", 5, 5)
+        board.apply_move((0, 1))
+        canonical, symmetry = isolation.canonical_position(tables, *game_position(board))
+        square = tables.permutations[symmetry][2 * 5 + 2]
+        path = os.path.join(self.folder, "5x5.book")
+        opening_book.write_book(path, 5, 5, {pack_position(*canonical): (square, 1.5, 7, 3)})
+        book = self.open_book(path)
+        self.assertEqual(len(book), 1)
+        self.assertEqual(book.probe(board), ((2, 2), 1.5, 7, 3))
+        for first, reply in (((1, 0), (2, 2)), ((4, 3), (2, 2)), ((3, 4), (2, 2))):
+            symmetric = isolation.Board("Player1", "Player2", 5, 5)
+            symmetric.apply_move(first)
+            self.assertEqual(book.probe(symmetric).move, reply)
+        board.apply_move((2, 2))
+        self.assertIsNone(book.probe(board))
+        self.assertIsNone(book.probe(isolation.Board("Player1", "Player2")))
+
+    def test_build_book(self):
+        """ The book holds the positions searched in the self-play games, with
+        a legal move and the number of games that reached it (searches that
+        time out on a busy machine are left out) """
+        path = os.path.join(self.folder, "5x5.book")
+        positions = opening_book.build_book(5, 5, path, plies=3, games=3,
+                                            time_limit=100, workers=2)
+        book = self.open_book(path)
+        self.assertEqual(len(book), positions)
+        board = isolation.Board("Player1", "Player2", 5, 5)
+        entry = book.probe(board)
+        if entry is not None:
+            self.assertLessEqual(entry.visits, 3)
+            self.assertIn(entry.move, board.get_legal_moves())
+        keys = list(book.keys)
+        self.assertEqual(keys, sorted(keys))
+
+    def test_timed_out_searches_are_skipped(self):
+        """ Positions whose search completes no iteration are not recorded,
+        and the game goes on with legal moves """
+        self.assertEqual(opening_book.play_book_game(5, 5, 6, 0, 0., 0), [])
+        with self.assertRaises(ValueError):
+            opening_book.build_book(8, 8, os.path.join(self.folder, "8x8.book"))
+
+    def test_agent_plays_book_moves(self):
+        """ CustomPlayer plays the moves of the book of the board size without
+        searching """
+        tables = isolation.symmetry_tables(5, 5)
+        board = isolation.Board("Player1", "Player2", 5, 5)
+        canonical, symmetry = isolation.canonical_position(tables, *game_position(board))
+        square = tables.permutations[symmetry][1 * 5 + 2]
+        path = os.path.join(self.folder, "5x5.book")
+        opening_book.write_book(path, 5, 5, {pack_position(*canonical): (square, 0.5, 9, 1)})
+        book = self.open_book(path)
+        opening_book._BOOKS[(5, 5)] = book
+        self.addCleanup(opening_book._BOOKS.pop, (5, 5))
+        agent = game_agent.CustomPlayer(book=True)
+        board = isolation.Board(agent, "Player2", 5, 5)
+        move = agent.get_move(board, board.get_legal_moves(), lambda: 1000.)
+        self.assertEqual(move, (1, 2))
+        self.assertIsNone(agent.nodes)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+"""This file contains the fixed opening suites used by the tournament.
+
+An opening is the pair of squares occupied by the first and second player on
+their first move. The suite of a board size contains every opening exactly
+once up to the symmetries of the board, in a fixed shuffled order, so that
+the first matches of a tournament already cover varied openings and every
+run plays the same ones.
+
+The suites are stored in the `openings` folder, one text file per board size
+with one opening "row_1 col_1 row_2 col_2" per line. Run this file to write
+them again:
+
+    python openings.py --size 7 7
+"""
+
+import argparse
+import os
+import random
+
+from isolation import board_symmetries
+
+# Seed of the shuffle giving the order of the openings in a suite
+SUITE_SEED = 0x0BE71465
+
+SUITE_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                            "openings")
+
+
+def opening_suite(width=7, height=7, seed=SUITE_SEED):
+    """Generate the opening suite of a board size.
+
+    Parameters
+    ----------
+    width, height : int (optional)
+        The size of the board.
+
+    seed : int (optional)
+        The seed of the shuffle giving the order of the openings.
+
+    Returns
+    -------
+    list<((int, int), (int, int))>
+        The (row, column) squares of the first and second player for one
+        representative of each class of symmetric openings.
+    """
+    symmetries = board_symmetries(width, height)
+    size = width * height
+    representatives = sorted({min((p[first], p[second]) for p in symmetries)
+                              for first in range(size)
+                              for second in range(size) if first != second})
+    random.Random(seed).shuffle(representatives)
+    return [(divmod(first, width), divmod(second, width))
+            for first, second in representatives]
+
+
+def suite_path(width=7, height=7):
+    """Return the path of the stored opening suite of a board size."""
+    return os.path.join(SUITE_FOLDER, "{}x{}.txt".format(width, height))
+
+
+def write_suite(path, suite):
+    """Write an opening suite to a text file."""
+    with open(path, "w") as suite_file:
+        for (r1, c1), (r2, c2) in suite:
+            suite_file.write("{} {} {} {}\n".format(r1, c1, r2, c2))
+
+
+def read_suite(path):
+    """Read an opening suite written by `write_suite()`."""
+    suite = []
+    with open(path) as suite_file:
+        for line in suite_file:
+            if line.strip():
+                r1, c1, r2, c2 = map(int, line.split())
+                suite.append(((r1, c1), (r2, c2)))
+    return suite
+
+
+def load_suite(width=7, height=7):
+    """Return the stored opening suite of a board size, or generate it if no
+    suite is stored for that size.
+    """
+    path = suite_path(width, height)
+    if os.path.exists(path):
+        return read_suite(path)
+    return opening_suite(width, height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write the opening suites "
+                                                 "used by the tournament.")
+    parser.add_argument("--size", type=int, nargs=2, action="append",
+                        metavar=("WIDTH", "HEIGHT"),
+                        help="board size of a suite to write (default: 7 7)")
+    args = parser.parse_args(argv)
+
+    os.makedirs(SUITE_FOLDER, exist_ok=True)
+    for width, height in args.size or [(7, 7)]:
+        suite = opening_suite(width, height)
+        write_suite(suite_path(width, height), suite)
+        print("{}x{}: {} openings".format(width, height, len(suite)))
+
+
+if __name__ == "__main__":
+    main()
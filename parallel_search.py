@@ -0,0 +1,391 @@
+"""This file contains the pool of worker processes used by `CustomPlayer` to
+search the root moves of a position in parallel, and the background process
+it uses to ponder (i.e., to search during the opponent's turn).
+
+The workers are started once and kept alive between moves (and games). Each
+one owns a copy of the searching player, with its own transposition table
+and move ordering state, and runs iterative deepening on the subset of the
+root moves it is given. The positions are sent to the workers as pickles in
+which the players, the shared geometry tables and the Zobrist keys are
+replaced by references, so a request costs a few hundred bytes.
+"""
+import io
+import multiprocessing
+import pickle
+import time
+
+from multiprocessing.connection import wait
+
+from isolation import Deadline
+from isolation import board_geometry
+from isolation.isolation import zobrist_keys
+
+
+# Kinds of objects written as references by `BoardPickler`. References only
+# hold integers: they are pickled in turn, and an integer cannot be mistaken
+# for a player or a lookup table.
+PLAYER, GEOMETRY, ZOBRIST = range(3)
+ACTIVE, INACTIVE = range(2)
+
+
+class BoardPickler(pickle.Pickler):
+    """Pickler writing the players of a board and its shared lookup tables
+    as references (see `BoardUnpickler`).
+    """
+    def __init__(self, file, game):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        geometry = game.geometry
+        size = (game.width, game.height)
+        self.references = {id(game.active_player): (PLAYER, ACTIVE),
+                           id(game.inactive_player): (PLAYER, INACTIVE),
+                           id(geometry): (GEOMETRY,) + size + (-1,),
+                           id(zobrist_keys(*size)): (ZOBRIST,) + size}
+        for field, value in enumerate(geometry):
+            if not isinstance(value, int):
+                self.references[id(value)] = (GEOMETRY,) + size + (field,)
+
+    def persistent_id(self, obj):
+        return self.references.get(id(obj))
+
+
+class BoardUnpickler(pickle.Unpickler):
+    """Unpickler resolving the references written by `BoardPickler`: the
+    active player of the board becomes `player`, the inactive player becomes
+    `opponent`, and the lookup tables are those of this process.
+    """
+    def __init__(self, file, player, opponent):
+        super().__init__(file)
+        self.players = (player, opponent)
+
+    def persistent_load(self, reference):
+        if reference[0] == PLAYER:
+            return self.players[reference[1]]
+        if reference[0] == GEOMETRY:
+            geometry = board_geometry(reference[1], reference[2])
+            return geometry if reference[3] < 0 else geometry[reference[3]]
+        return zobrist_keys(reference[1], reference[2])
+
+
+def search_worker(connection, player_cls, player_args, tt=None):
+    """Serve search requests until the pool is closed.
+
+    If a shared transposition table `tt` is given, the player of the worker
+    uses it instead of a table of its own.
+
+    Each request is a pickled (request id, board, root moves, time limit)
+    tuple; the reply is the (request id, iterations, nodes) tuple holding the
+    `iterations` and `nodes` of the worker's player after searching the root
+    moves within the time limit (in milliseconds of wall-clock time).
+    """
+    player = player_cls(**player_args)
+    if tt is not None:
+        # the owner of the pool starts the searches of the shared table
+        tt.follower = True
+        player.tt = tt
+    opponent = object()
+    while True:
+        try:
+            data = connection.recv_bytes()
+        except EOFError:
+            return
+        if not data:
+            return
+        request_id, game, moves, time_limit = BoardUnpickler(
+            io.BytesIO(data), player, opponent).load()
+        player.root_moves = moves
+        if tt is not None:
+            # the owner of the pool clears the shared table when a new game
+            # starts, before sending the first request of the game
+            player.last_move_count = -1
+        player.get_move(game, list(moves), Deadline(time_limit))
+        connection.send((request_id, player.iterations, player.nodes))
+
+
+class SearchPool(object):
+    """Pool of persistent worker processes searching disjoint subsets of the
+    root moves of a position.
+
+    Parameters
+    ----------
+    workers : int
+        The number of worker processes.
+
+    player_cls : type
+        The class of the searching player; it must have `root_moves`,
+        `iterations` and `nodes` attributes like `CustomPlayer`.
+
+    player_args : dict
+        The arguments used by every worker to create its player.
+
+    tt : transposition.SharedTranspositionTable (optional)
+        A table shared by the players of all the workers.
+    """
+    def __init__(self, workers, player_cls, player_args, tt=None):
+        self.connections = []
+        self.processes = []
+        self.request_id = 0
+        for _ in range(workers):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=search_worker, daemon=True,
+                args=(worker_connection, player_cls, player_args, tt))
+            process.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def search(self, game, moves, time_left, margin):
+        """Search the root moves of a position in the workers.
+
+        The moves are dealt to the workers in turn, so the first moves (the
+        most promising ones if they are ordered) go to different workers.
+
+        Parameters
+        ----------
+        game : isolation.Board
+            The position to search
+
+        moves : list<(int, int)>
+            The root moves to search
+
+        time_left : callable
+            A function returning the number of milliseconds left in the turn
+
+        margin : float
+            The number of milliseconds left in the turn when the workers must
+            have stopped searching; replies arriving after half the margin is
+            left are ignored.
+
+        Returns
+        -------
+        list<(list, int)>
+            The (iterations, nodes) reply of every worker that answered in
+            time
+        """
+        self.request_id += 1
+        time_limit = time_left() - margin
+        pending = {}
+        for index, connection in enumerate(self.connections):
+            subset = moves[index::len(self.connections)]
+            if not subset:
+                break
+            data = io.BytesIO()
+            BoardPickler(data, game).dump((self.request_id, game, subset, time_limit))
+            connection.send_bytes(data.getvalue())
+            pending[connection] = subset
+
+        replies = []
+        while pending:
+            timeout = (time_left() - margin / 2) / 1000
+            if timeout <= 0:
+                break
+            for connection in wait(list(pending), timeout):
+                request_id, iterations, nodes = connection.recv()
+                # replies to earlier requests come from workers that were
+                # still searching when the previous move was returned
+                if request_id == self.request_id:
+                    replies.append((iterations, nodes))
+                    del pending[connection]
+        return replies
+
+    def close(self):
+        """Stop the worker processes."""
+        for connection in self.connections:
+            try:
+                connection.send_bytes(b"")
+            except OSError:
+                pass
+            connection.close()
+        for process in self.processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+        self.connections = []
+        self.processes = []
+
+
+# Deadline of a pondering search that has not been given a time limit yet
+NEVER = 1 << 62
+
+
+class SharedDeadline(Deadline):
+    """A `Deadline` on the wall clock whose end is read from shared memory,
+    so that another process can move it while the search is running.
+
+    The end is the `time.perf_counter_ns()` value stored in `shared_end`;
+    this clock is system-wide, so it can be set by any process. The shared
+    value is read at every clock read of the deadline, which happens at most
+    `check_every` calls to `expired()` apart.
+
+    Parameters
+    ----------
+    shared_end : multiprocessing.RawValue
+        The shared 64-bit end of the deadline, in nanoseconds.
+
+    margin : float (optional)
+        The number of milliseconds before the shared end at which this
+        deadline expires.
+
+    check_every : int (optional)
+        The maximum number of calls to `expired()` between two clock reads.
+    """
+    __slots__ = ('shared_end', 'margin')
+
+    def __init__(self, shared_end, margin=0, check_every=256):
+        super().__init__(0, check_every)
+        self.shared_end = shared_end
+        self.margin = int(margin * 1e6)
+        self.end = shared_end.value - self.margin
+
+    def __call__(self):
+        self.end = self.shared_end.value - self.margin
+        return super().__call__()
+
+    def with_margin(self, millis):
+        deadline = SharedDeadline(self.shared_end, self.margin / 1e6 + millis,
+                                  self.check_every)
+        deadline.start = self.start
+        return deadline
+
+    def check(self):
+        self.end = self.shared_end.value - self.margin
+        return super().check()
+
+
+def ponder_worker(connection, player_cls, player_args, shared_end, shared_move):
+    """Serve pondering requests until the search is closed.
+
+    Each request is a pickled (request id, board) pair; the worker's player
+    searches the board until the deadline in `shared_end` and replies with
+    the (request id, move, principal variation, nodes) tuple of its search.
+    The best move of every iteration it completes is also written to
+    `shared_move` (see `PonderSearch.partial_move()`).
+    """
+    player = player_cls(**player_args)
+    opponent = object()
+    request_id = 0
+
+    def publish(move):
+        shared_move.value = pack_move(request_id, move)
+
+    player.on_iteration = publish
+    while True:
+        try:
+            data = connection.recv_bytes()
+        except EOFError:
+            return
+        if not data:
+            return
+        request_id, game = BoardUnpickler(io.BytesIO(data), player, opponent).load()
+        move = player.get_move(game, game.get_legal_moves(), SharedDeadline(shared_end))
+        connection.send((request_id, move, player.pv, player.nodes))
+
+
+def pack_move(request_id, move):
+    """Pack a request id and a move into one 64-bit value, written and read
+    at once by the ponder worker and its parent."""
+    return (request_id << 16) | (move[0] << 8) | move[1]
+
+
+class PonderSearch(object):
+    """Background process searching the position expected at the start of the
+    next turn while the opponent is thinking.
+
+    The search runs without a time limit until `finish()` gives it the end
+    of the turn (when the expected position is reached: a ponder hit) or
+    `stop()` aborts it (when it is not: a ponder miss). The process keeps its
+    player, and so its transposition table and move ordering state, from
+    one search to the next.
+
+    Parameters
+    ----------
+    player_cls : type
+        The class of the searching player; it must have `pv`, `nodes` and
+        `on_iteration` attributes like `CustomPlayer`.
+
+    player_args : dict
+        The arguments used to create the player of the process.
+    """
+    def __init__(self, player_cls, player_args):
+        self.shared_end = multiprocessing.RawValue('q', 0)
+        self.shared_move = multiprocessing.RawValue('q', 0)
+        self.connection, worker_connection = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=ponder_worker, daemon=True,
+            args=(worker_connection, player_cls, player_args, self.shared_end,
+                  self.shared_move))
+        self.process.start()
+        worker_connection.close()
+        self.request_id = 0
+        self.position = None
+
+    def start(self, game):
+        """Start searching a position without a time limit."""
+        self.request_id += 1
+        self.shared_end.value = NEVER
+        data = io.BytesIO()
+        BoardPickler(data, game).dump((self.request_id, game))
+        self.connection.send_bytes(data.getvalue())
+        self.position = game.hash
+
+    def is_pondering(self, game):
+        """Test whether the search in progress is searching the position."""
+        return self.position is not None and self.position == game.hash
+
+    def stop(self):
+        """Abort the search in progress, if any; its result is discarded."""
+        self.shared_end.value = 0
+        self.position = None
+
+    def finish(self, time_left, margin):
+        """Let the search in progress run until the end of the turn (minus
+        the timeout margin of its player and half that margin again) and
+        return its result.
+
+        Parameters
+        ----------
+        time_left : callable
+            A function returning the number of milliseconds left in the turn
+
+        margin : float
+            The number of milliseconds left in the turn when a result that
+            has not arrived is abandoned.
+
+        Returns
+        -------
+        ((int, int), list, int) or None
+            The move, principal variation and number of nodes of the search,
+            or None if it did not reply in time (see `partial_move()`)
+        """
+        end = time_left() - margin / 2
+        self.shared_end.value = time.perf_counter_ns() + int(end * 1e6)
+        self.position = None
+        while True:
+            timeout = (time_left() - margin) / 1000
+            if timeout <= 0 or not self.connection.poll(timeout):
+                self.shared_end.value = 0
+                return None
+            request_id, move, pv, nodes = self.connection.recv()
+            # replies to earlier requests come from searches that were stopped
+            if request_id == self.request_id:
+                return move, pv, nodes
+
+    def partial_move(self):
+        """Return the best move of the last iteration completed by the latest
+        search, or None if it did not complete any."""
+        request_id, square = divmod(self.shared_move.value, 1 << 16)
+        if request_id != self.request_id:
+            return None
+        return divmod(square, 1 << 8)
+
+    def close(self):
+        """Stop the background process."""
+        self.shared_end.value = 0
+        try:
+            self.connection.send_bytes(b"")
+        except OSError:
+            pass
+        self.connection.close()
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.terminate()
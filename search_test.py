@@ -0,0 +1,491 @@
+"""
+This file contains test cases for the search components used by
+`game_agent.CustomPlayer` (transposition table, in-place search, ...). The
+tests in agent_test.py cover the required search interface; these tests
+check that the optional speed-ups do not change the result of the search.
+"""
+import io
+import multiprocessing
+import pickle
+import random
+import time
+import unittest
+
+import isolation
+import game_agent
+
+from isolation.bitboard import popcount
+from isolation.endgame import partition, partition_utility, solve
+from parallel_search import BoardPickler, BoardUnpickler
+from parallel_search import SharedDeadline, NEVER
+
+from sample_players import improved_score
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from transposition import DEPTH, VALUE, MOVE, ENTRY_BYTES
+from transposition import SharedTranspositionTable, RECORD
+
+
+def random_position(board, num_moves, seed):
+    """Apply a number of random moves to the board in place."""
+    rng = random.Random(seed)
+    for _ in range(num_moves):
+        board.apply_move(rng.choice(board.get_legal_moves()))
+    return board
+
+
+class TranspositionTableTest(unittest.TestCase):
+
+    def make_table(self, size_mb):
+        return TranspositionTable(size_mb)
+
+    def test_store_and_probe(self):
+        """ Stored entries can be found again by their key """
+        tt = self.make_table(1)
+        tt.store(12345, 3, EXACT, 1.5, (2, 1))
+        self.assertEqual(tt.probe(12345)[DEPTH:MOVE + 1], (3, EXACT, 1.5, (2, 1)))
+        self.assertIsNone(tt.probe(54321))
+
+    def test_two_tier_replacement(self):
+        """ Shallow entries do not evict deeper entries of the same search,
+        but still replace the always-replace slot """
+        tt = self.make_table(1)
+        deep_key = 7
+        other_key = deep_key + (tt.mask + 1)  # same bucket
+        tt.store(deep_key, 5, EXACT, 1., (0, 1))
+        tt.store(other_key, 2, LOWER, 2., (1, 0))
+        self.assertEqual(tt.probe(deep_key)[DEPTH], 5)
+        self.assertEqual(tt.probe(other_key)[DEPTH], 2)
+
+        third_key = deep_key + 2 * (tt.mask + 1)
+        tt.store(third_key, 1, EXACT, 3., (1, 1))
+        self.assertIsNotNone(tt.probe(deep_key))
+        self.assertIsNone(tt.probe(other_key))
+
+        # entries from an earlier search can be evicted by shallower ones
+        tt.new_search()
+        tt.store(other_key, 1, EXACT, 4., None)
+        self.assertIsNone(tt.probe(deep_key))
+        self.assertEqual(tt.probe(other_key)[VALUE], 4.)
+
+    def test_memory_cap(self):
+        """ The number of slots grows with the memory budget """
+        self.assertLess(len(TranspositionTable(1).table),
+                        len(TranspositionTable(8).table))
+
+    def test_memory_budget(self):
+        """ The table fills more than half of its memory budget, without
+        exceeding it """
+        for size_mb in (0.5, 1, 3, 8):
+            budget = int(size_mb * (1 << 20)) // ENTRY_BYTES
+            slots = len(TranspositionTable(size_mb).table)
+            self.assertLessEqual(slots, budget)
+            self.assertGreater(2 * slots, budget)
+
+
+def store_in_child(tt, key):
+    tt.store(key, 4, LOWER, -2.5, (3, 6))
+
+
+class SharedTranspositionTableTest(TranspositionTableTest):
+
+    def make_table(self, size_mb):
+        tt = SharedTranspositionTable(size_mb)
+        self.addCleanup(tt.close)
+        return tt
+
+    def test_memory_cap(self):
+        """ The number of buckets grows with the memory budget """
+        self.assertLess(self.make_table(1).mask, self.make_table(8).mask)
+
+    def test_memory_budget(self):
+        """ The records fill more than half of the memory budget, without
+        exceeding it """
+        for size_mb in (0.5, 1, 3, 8):
+            budget = int(size_mb * (1 << 20))
+            size = len(self.make_table(size_mb).buffer)
+            self.assertLessEqual(size, budget)
+            self.assertGreater(2 * size, budget)
+
+    def test_shared_age(self):
+        """ Every process using the table sees the age of the current
+        search, which followers do not advance """
+        tt = self.make_table(1)
+        copy = pickle.loads(pickle.dumps(tt))
+        self.addCleanup(copy.close)
+        tt.new_search()
+        self.assertEqual(copy.age, 1)
+        copy.follower = True
+        copy.new_search()
+        self.assertEqual(tt.age, 1)
+        copy.store(12345, 3, EXACT, 1.5, (2, 1))
+        self.assertEqual(tt.probe(12345)[-1], 1)
+        tt.clear()
+        self.assertEqual(copy.age, 0)
+
+    def test_special_values(self):
+        tt = self.make_table(1)
+        for key, value, move in ((0, float("inf"), None), (2**64 - 1, -0.5, (0, 0)),
+                                 (99, float("-inf"), (6, 6))):
+            tt.store(key, 0, UPPER, value, move)
+            self.assertEqual(tt.probe(key)[DEPTH:MOVE + 1], (0, UPPER, value, move))
+
+    def test_torn_record_is_ignored(self):
+        """ A record whose words do not match its checksum is not returned """
+        tt = self.make_table(1)
+        tt.store(12345, 3, EXACT, 1.5, (2, 1))
+        slot = (12345 & tt.mask) << 1
+        check, data, bits = RECORD.unpack_from(tt.buffer, slot * RECORD.size)
+        RECORD.pack_into(tt.buffer, slot * RECORD.size, check, data, bits ^ 1)
+        self.assertIsNone(tt.probe(12345))
+
+    def test_shared_between_processes(self):
+        """ Entries stored by another process can be probed """
+        tt = self.make_table(1)
+        for context in ("fork", "spawn"):
+            key = 424242 if context == "fork" else 434343
+            process = multiprocessing.get_context(context).Process(
+                target=store_in_child, args=(tt, key))
+            process.start()
+            process.join()
+            self.assertEqual(tt.probe(key)[DEPTH:MOVE + 1], (4, LOWER, -2.5, (3, 6)))
+
+    def test_player_copies_share_table(self):
+        """ A pickled copy of a player opens the table of the original, and
+        closing the copy leaves the table to the original """
+        agent = game_agent.CustomPlayer(tt_mb=1, shared_tt=True)
+        self.addCleanup(agent.close)
+        copy = pickle.loads(pickle.dumps(agent))
+        self.assertEqual(copy.tt.memory.name, agent.tt.memory.name)
+        self.assertFalse(copy.tt.owner)
+        store_in_child(copy.tt, 424242)
+        copy.close()
+        self.assertEqual(agent.tt.probe(424242)[DEPTH:MOVE + 1], (4, LOWER, -2.5, (3, 6)))
+
+    def test_shared_between_seats(self):
+        """ Copies of a player sharing a table in the two seats of a game
+        find the values of a search without the table """
+        for seed in range(5):
+            agent = game_agent.CustomPlayer(4, improved_score, False, 'alphabeta',
+                                            tt_mb=1, shared_tt=True)
+            self.addCleanup(agent.close)
+            copy = pickle.loads(pickle.dumps(agent))
+            agent.time_left = copy.time_left = lambda: 1e9
+            board = random_position(isolation.Board(agent, copy), 10, seed)
+            agent.alphabeta(board, 4)
+            for move in board.get_legal_moves():
+                child = board.forecast_move(move)
+                copy.tt = None
+                value = copy.alphabeta(child, 3)[0]
+                copy.tt = agent.tt
+                self.assertEqual(copy.alphabeta(child, 3)[0], value)
+
+
+class SearchModeTest(unittest.TestCase):
+
+    def search(self, seed, depth, **kwargs):
+        agent = game_agent.CustomPlayer(depth, improved_score, False,
+                                        'alphabeta', **kwargs)
+        agent.time_left = lambda: 1e9
+        self.addCleanup(agent.close)
+        board = random_position(isolation.Board(agent, 'opponent'), 10, seed)
+        before = board.to_string()
+        result = agent.alphabeta(board, depth)
+        self.assertEqual(before, board.to_string())
+        return result
+
+    def test_inplace_search(self):
+        """ In-place search gives the same result as searching on copies """
+        for seed in range(5):
+            self.assertEqual(self.search(seed, 4),
+                             self.search(seed, 4, inplace=True))
+
+    def test_transposition_table_value(self):
+        """ The transposition table does not change the root value of a
+        fixed-depth search """
+        for seed in range(5):
+            value, _ = self.search(seed, 4)
+            tt_value, tt_move = self.search(seed, 4, inplace=True, tt_mb=1)
+            self.assertEqual(value, tt_value)
+            shared_value, _ = self.search(seed, 4, inplace=True, tt_mb=1,
+                                          shared_tt=True)
+            self.assertEqual(value, shared_value)
+
+    def test_move_ordering_value(self):
+        """ Move ordering does not change the root value of a fixed-depth
+        search and returns a legal move """
+        for seed in range(5):
+            value, _ = self.search(seed, 4)
+            ordered_value, move = self.search(seed, 4, ordering=True)
+            self.assertEqual(value, ordered_value)
+            self.assertIsNotNone(move)
+
+    def test_alphabeta_returns_best_move(self):
+        """ The move returned by alpha-beta achieves the root value, which
+        matches the minimax value of the position """
+        for seed in range(5):
+            value, move = self.search(seed, 3)
+            agent = game_agent.CustomPlayer(3, improved_score, False, 'minimax')
+            agent.time_left = lambda: 1e9
+            board = random_position(isolation.Board(agent, 'opponent'), 10, seed)
+            self.assertEqual(agent.minimax(board, 3)[0], value)
+            self.assertIn(move, board.get_legal_moves())
+            self.assertEqual(agent.min_value(board.forecast_move(move), 2), value)
+
+
+class MoveOrderingTest(unittest.TestCase):
+
+    def test_order_moves(self):
+        """ PV move, hash move, killers, then history order """
+        agent = game_agent.CustomPlayer(ordering=True)
+        agent.killers = [[(4, 4)]]
+        agent.history = ({(2, 2): 1, (3, 3): 9}, {})
+        moves = [(1, 1), (2, 2), (3, 3), (4, 4), (5, 5), (6, 6)]
+        self.assertEqual(agent.order_moves(moves, 0, 0, (6, 6), (5, 5)),
+                         [(6, 6), (5, 5), (4, 4), (3, 3), (2, 2), (1, 1)])
+        self.assertEqual(agent.order_moves(moves, 0, 1),
+                         [(4, 4), (1, 1), (2, 2), (3, 3), (5, 5), (6, 6)])
+
+    def test_iterations_stop_at_open_cells(self):
+        """ Iterative deepening stops once the depth covers every open cell,
+        so the ordering state does not grow for the rest of the turn """
+        agent = game_agent.CustomPlayer(score_fn=improved_score, method='alphabeta',
+                                        ordering=True)
+        rng = random.Random(3)
+        board = isolation.Board(agent, 'opponent')
+        while len(board.get_blank_spaces()) > 8 or board.active_player is not agent:
+            if not board.get_legal_moves():
+                board = isolation.Board(agent, 'opponent')
+            board.apply_move(rng.choice(board.get_legal_moves()))
+        agent.get_move(board, board.get_legal_moves(), isolation.Deadline(150))
+        self.assertLessEqual(agent.iterations[-1][0], 8)
+        self.assertLessEqual(len(agent.killers), 9)
+
+
+class ParallelSearchTest(unittest.TestCase):
+
+    def test_board_pickle_round_trip(self):
+        """ Boards sent to the workers keep their position and replace the
+        players by the worker's own """
+        for board_cls in (isolation.Board, isolation.BitBoard):
+            board = random_position(board_cls('player', 'opponent'), 6, 1)
+            data = io.BytesIO()
+            BoardPickler(data, board).dump(board)
+            data.seek(0)
+            copy = BoardUnpickler(data, 'worker', 'other').load()
+            self.assertIs(type(copy), board_cls)
+            self.assertEqual(copy.active_player, 'worker')
+            self.assertEqual(copy.hash, board.hash)
+            self.assertEqual(copy.to_string(), board.to_string())
+            self.assertEqual(copy.get_legal_moves(), board.get_legal_moves())
+            self.assertIs(copy.geometry, board.geometry)
+            self.assertLess(len(data.getvalue()), 1000)
+
+    def test_root_split_value(self):
+        """ Splitting the root moves between workers finds a move with the
+        value of the serial search """
+        for kwargs in ({}, {'tt_mb': 1, 'shared_tt': True}):
+            self.check_root_split_value(**kwargs)
+
+    def check_root_split_value(self, **kwargs):
+        agent = game_agent.CustomPlayer(3, improved_score, False, 'alphabeta',
+                                        workers=2, **kwargs)
+        try:
+            for seed in range(3):
+                board = random_position(isolation.Board(agent, 'opponent'), 10, seed)
+                move = agent.get_move(board.copy(), board.get_legal_moves(),
+                                      isolation.Deadline(10000))
+                self.assertGreater(agent.nodes, 0)
+                serial = game_agent.CustomPlayer(3, improved_score, False, 'alphabeta')
+                serial.time_left = lambda: 1e9
+                value, _ = serial.alphabeta(board, 3)
+                serial.root_moves = [move]
+                self.assertEqual(serial.alphabeta(board, 3), (value, move))
+        finally:
+            agent.close()
+
+    def test_parallel_search_requires_alphabeta(self):
+        with self.assertRaises(ValueError):
+            game_agent.CustomPlayer(method='minimax', workers=2)
+
+
+class PonderTest(unittest.TestCase):
+
+    def test_ponder_hit_and_miss(self):
+        """ The pondering search is used when the predicted reply is played
+        and stopped otherwise """
+        agent = game_agent.CustomPlayer(score_fn=improved_score, method='alphabeta',
+                                        inplace=True, tt_mb=1, ordering=True,
+                                        ponder=True)
+        self.addCleanup(agent.close)
+        board = random_position(isolation.Board(agent, 'opponent'), 6, 0)
+
+        move = agent.get_move(board.copy(), board.get_legal_moves(),
+                              isolation.Deadline(100))
+        self.assertIsNotNone(agent.ponderer.position)
+        reply = agent.pv[1]
+        board.apply_move(move)
+        board.apply_move(reply)
+        self.assertTrue(agent.ponderer.is_pondering(board))
+
+        move = agent.get_move(board.copy(), board.get_legal_moves(),
+                              isolation.Deadline(100))
+        self.assertEqual(agent.ponder_hits, 1)
+        self.assertIn(move, board.get_legal_moves())
+        # nodes is None if the pondering search did not reply in time, which
+        # happens on a busy machine
+        if agent.nodes is not None:
+            self.assertGreater(agent.nodes, 0)
+
+        board.apply_move(move)
+        replies = board.get_legal_moves()
+        predicted = agent.ponderer.position
+        board.apply_move(next(m for m in replies
+                              if board.forecast_move(m).hash != predicted))
+        move = agent.get_move(board.copy(), board.get_legal_moves(),
+                              isolation.Deadline(100))
+        self.assertEqual(agent.ponder_misses, 1)
+        self.assertIn(move, board.get_legal_moves())
+
+    def test_ponder_hit_out_of_time(self):
+        """ A ponder hit whose search cannot reply before the end of the turn
+        plays the best move of the last iteration the search completed """
+        agent = game_agent.CustomPlayer(score_fn=improved_score, method='alphabeta',
+                                        inplace=True, tt_mb=1, ordering=True,
+                                        ponder=True)
+        self.addCleanup(agent.close)
+        board = random_position(isolation.Board(agent, 'opponent'), 6, 0)
+        move = agent.get_move(board.copy(), board.get_legal_moves(),
+                              isolation.Deadline(100))
+        board.apply_move(move)
+        board.apply_move(agent.pv[1])
+        time.sleep(0.1)
+        self.assertIn(agent.ponderer.partial_move(), board.get_legal_moves())
+
+        move = agent.get_move(board.copy(), board.get_legal_moves(),
+                              isolation.Deadline(agent.TIMER_THRESHOLD))
+        self.assertEqual(agent.ponder_hits, 1)
+        self.assertIn(move, board.get_legal_moves())
+        self.assertIsNone(agent.nodes)
+
+    def test_shared_deadline(self):
+        """ A shared deadline follows the end set by another process """
+        end = multiprocessing.RawValue('q', NEVER)
+        deadline = SharedDeadline(end, check_every=4)
+        self.assertFalse(deadline.expired())
+        margin = deadline.with_margin(5)
+        end.value = 0
+        self.assertTrue(deadline.check())
+        self.assertTrue(margin.check())
+        self.assertLess(margin(), 0)
+
+
+class EndgameSearchTest(unittest.TestCase):
+
+    def partitioned_board(self, agent, seed, max_squares=36):
+        """Play random moves until the players are partitioned into regions
+        of at most `max_squares` squares."""
+        rng = random.Random(seed)
+        board = isolation.BitBoard(agent, 'opponent', 6, 6)
+        while True:
+            regions = partition(board)
+            if board.active_player is agent and regions and \
+                    max(map(popcount, regions)) <= max_squares and \
+                    len(board.get_legal_moves()) > 1:
+                return board
+            moves = board.get_legal_moves()
+            if not moves:
+                board = isolation.BitBoard(agent, 'opponent', 6, 6)
+                continue
+            board.apply_move(rng.choice(moves))
+
+    def test_endgame_move(self):
+        """ A partitioned player plays the first move of its longest path
+        without searching """
+        agent = game_agent.CustomPlayer(score_fn=improved_score, method='alphabeta',
+                                        endgame=True)
+        for seed in range(5):
+            board = self.partitioned_board(agent, seed)
+            own_length, _, _ = solve(board)
+            move = agent.get_move(board, board.get_legal_moves(),
+                                  isolation.Deadline(1000))
+            self.assertEqual(agent.iterations, [])
+            self.assertEqual(solve(board.forecast_move(move))[1], own_length - 1)
+
+    def test_endgame_score(self):
+        """ endgame_score is exact in partitioned positions and agrees with
+        custom_score elsewhere """
+        agent = game_agent.CustomPlayer()
+        for seed in range(5):
+            board = self.partitioned_board(agent, seed, 16)
+            own_length, opp_length, _ = solve(board)
+            expected = float("inf") if own_length > opp_length else float("-inf")
+            self.assertEqual(game_agent.endgame_score(board, agent), expected)
+            self.assertEqual(game_agent.endgame_score(board, 'opponent'), -expected)
+        board = random_position(isolation.Board(agent, 'opponent'), 4, 0)
+        self.assertEqual(game_agent.endgame_score(board, agent),
+                         game_agent.custom_score(board, agent))
+
+    def test_endgame_score_limits(self):
+        """ The endgame is not solved by the heuristic past `max_nodes`
+        squares, and the player keeps the solved paths for the current move
+        only """
+        agent = game_agent.CustomPlayer(score_fn=game_agent.endgame_score,
+                                        method='alphabeta')
+        board = self.partitioned_board(agent, 0, 16)
+        self.assertIsNone(partition_utility(board, agent, max_nodes=1))
+        self.assertEqual(agent.score(board, agent),
+                         game_agent.endgame_score(board, agent))
+        self.assertTrue(agent.score_memo)
+        agent.get_move(board, [], isolation.Deadline(50))
+        self.assertFalse(agent.score_memo)
+
+
+class OpeningSearchTest(unittest.TestCase):
+
+    def test_distinct_moves(self):
+        """ The first two plies keep one move per class of symmetric moves """
+        board = isolation.Board('player', 'opponent')
+        moves = board.get_legal_moves()
+        distinct = isolation.distinct_moves(board, moves)
+        self.assertEqual(len(distinct), 10)
+        for first, replies in (((3, 3), 9), ((0, 0), 27), ((0, 1), 48)):
+            after = board.forecast_move(first)
+            self.assertEqual(len(isolation.distinct_moves(after, after.get_legal_moves())),
+                             replies)
+        after = board.forecast_move((3, 3)).forecast_move((1, 2))
+        self.assertEqual(isolation.distinct_moves(after, after.get_legal_moves()),
+                         after.get_legal_moves())
+        # every move is symmetric to a kept move
+        symmetries = isolation.board_symmetries(7, 7)
+        self.assertEqual({p[r * 7 + c] for r, c in distinct for p in symmetries},
+                         set(range(49)))
+
+    def test_opening_search_value(self):
+        """ Searching only the distinct opening moves does not change the
+        value of a fixed-depth search """
+        for method in ('minimax', 'alphabeta'):
+            for num_moves in (0, 1):
+                results = []
+                for opening_search in (False, True):
+                    agent = game_agent.CustomPlayer(3, improved_score, False, method,
+                                                    opening_search=opening_search)
+                    agent.time_left = lambda: 1e9
+                    board = random_position(isolation.Board(agent, 'opponent', 5, 5),
+                                            num_moves, 0)
+                    search = agent.minimax if method == 'minimax' else agent.alphabeta
+                    results.append(search(board, 3))
+                self.assertEqual(results[0][0], results[1][0])
+
+    def test_first_move_is_searched(self):
+        """ With opening_search the first move is searched instead of playing
+        the centre square """
+        agent = game_agent.CustomPlayer(score_fn=improved_score, method='alphabeta',
+                                        opening_search=True)
+        board = isolation.Board(agent, 'opponent', 5, 5)
+        move = agent.get_move(board, board.get_legal_moves(), isolation.Deadline(100))
+        self.assertIn(move, isolation.distinct_moves(board, board.get_legal_moves()))
+        self.assertGreater(len(agent.iterations), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
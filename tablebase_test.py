@@ -0,0 +1,96 @@
+"""
+This file contains test cases for the tablebases of small boards built by
+tablebase.py, checking the stored values against an exhaustive search.
+"""
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import game_agent
+import isolation
+import tablebase
+
+
+def solve(board, cache):
+    """Return the value of a board for its active player (the number of
+    plies left with perfect play, odd if it wins) by exhaustive search."""
+    key = (board.to_string(), board.active_player)
+    if key not in cache:
+        cache[key] = tablebase.position_value(
+            [solve(board.forecast_move(move), cache)
+             for move in board.get_legal_moves()])
+    return cache[key]
+
+
+class TablebaseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+
+    def build(self, width, height, workers=1):
+        path = os.path.join(self.folder, "{}x{}-{}.tb".format(width, height, workers))
+        tablebase.build_tablebase(width, height, path, workers)
+        table = tablebase.Tablebase(path)
+        self.addCleanup(table.close)
+        return path, table
+
+    def test_values_match_search(self):
+        """ The tablebase holds the value of every reachable position, as
+        found by exhaustive search """
+        for width, height in ((4, 4), (4, 3)):
+            _, table = self.build(width, height)
+            cache = {}
+            for seed in range(20):
+                rng = random.Random(seed)
+                board = isolation.Board("Player1", "Player2", width, height)
+                while True:
+                    self.assertEqual(table.probe(board), solve(board, cache))
+                    if not board.get_legal_moves():
+                        break
+                    board.apply_move(rng.choice(board.get_legal_moves()))
+
+    def test_best_move(self):
+        """ The best move keeps the value of the position """
+        _, table = self.build(4, 4)
+        cache = {}
+        for seed in range(20):
+            board = isolation.BitBoard("Player1", "Player2", 4, 4)
+            rng = random.Random(seed)
+            for _ in range(rng.randrange(4)):
+                board.apply_move(rng.choice(board.get_legal_moves()))
+            result = table.best_move(board)
+            if not board.get_legal_moves():
+                self.assertIsNone(result)
+                continue
+            move, value = result
+            self.assertEqual(value, solve(board, cache))
+            self.assertEqual(solve(board.forecast_move(move), cache), value - 1)
+
+    def test_parallel_build(self):
+        """ Workers build the same file as a serial build """
+        path, table = self.build(4, 3)
+        parallel_path, parallel_table = self.build(4, 3, workers=2)
+        with open(path, "rb") as serial_file, open(parallel_path, "rb") as parallel_file:
+            self.assertEqual(serial_file.read(), parallel_file.read())
+        self.assertIsNone(table.probe(isolation.Board("Player1", "Player2")))
+
+    def test_agent_plays_tablebase_moves(self):
+        """ CustomPlayer plays the moves of the tablebase of the board size
+        without searching """
+        _, table = self.build(4, 4)
+        tablebase._TABLEBASES[(4, 4)] = table
+        self.addCleanup(tablebase._TABLEBASES.pop, (4, 4))
+        agent = game_agent.CustomPlayer(tablebase=True)
+        board = isolation.Board(agent, "Player2", 4, 4)
+        for move in ((0, 0), (3, 3)):
+            board.apply_move(move)
+        move = agent.get_move(board, board.get_legal_moves(), lambda: 1000.)
+        self.assertEqual((move, table.probe(board)), table.best_move(board))
+        self.assertIsNone(agent.nodes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,15 +17,27 @@ For example, if the random moves chosen for initialization are (5, 2) and
 agentB at (1, 3) as player 2 then play to conclusion; the agents swap
 initiative in the second match with agentB at (5, 2) as player 1 and agentA at
 (1, 3) as player 2.
+
+By default the initial moves are not random: the matches go through the fixed
+opening suite of the board (see openings.py) in order, so that every run plays
+the same openings and the results vary less from one run to the next.
 """
 
+import argparse
 import itertools
+import json
+import math
+import os
 import random
 import warnings
 
 from collections import namedtuple
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
 
 from isolation import Board
+from openings import load_suite
+from openings import read_suite
 from sample_players import RandomPlayer
 from sample_players import null_score
 from sample_players import open_move_score
@@ -35,6 +47,8 @@ from game_agent import custom_score
 
 NUM_MATCHES = 5  # number of matches against each opponent
 TIME_LIMIT = 150  # number of milliseconds before timeout
+CLOCK = "wall"  # clock measuring TIME_LIMIT: "wall", "thread" or "process"
+CONFIDENCE_Z = 1.96  # normal quantile of the 95% Elo confidence intervals
 
 TIMEOUT_WARNING = "One or more agents lost a match this round due to " + \
                   "timeout. The get_move() function must return before " + \
@@ -56,28 +70,151 @@ same opponents.
 
 Agent = namedtuple("Agent", ["player", "name"])
 
+# The outcome of a match: the number of games won by each player, the
+# (wall-clock ms, CPU ms) pair measured for every move of each player, and
+# the `GameRecord` of each game
+MatchResult = namedtuple("MatchResult", ["wins_1", "wins_2",
+                                         "move_times_1", "move_times_2",
+                                         "games"])
+
+# The course of one game of a match: the player of the match (1 or 2) that
+# moved first after the opening, the two opening moves, the player that won,
+# the reason the game ended, and the (wall-clock ms, CPU ms) pair and the
+# number of nodes searched (None if unknown) for every move in order
+GameRecord = namedtuple("GameRecord", ["first", "opening", "winner",
+                                       "termination", "move_times", "nodes"])
+
+# Parameters of a sequential probability ratio test between the hypotheses
+# H0: "the Elo difference is elo0" and H1: "the Elo difference is elo1",
+# with false positive rate alpha and false negative rate beta
+SPRT = namedtuple("SPRT", ["elo0", "elo1", "alpha", "beta"])
+
+
+def expected_score(elo):
+    """
+    Return the expected score of a player rated `elo` points above its
+    opponent under the logistic Elo model.
+    """
+    return 1. / (1. + 10. ** (-elo / 400.))
+
+
+def elo_difference(score):
+    """
+    Return the Elo difference corresponding to an expected `score` between
+    0 and 1 (the inverse of `expected_score()`); the difference is infinite
+    when one of the players won every game.
+    """
+    if score <= 0.:
+        return float("-inf")
+    if score >= 1.:
+        return float("inf")
+    return -400. * math.log10(1. / score - 1.)
+
+
+def elo_interval(wins, losses, z=CONFIDENCE_Z):
+    """
+    Estimate the Elo difference of a player that won `wins` games and lost
+    `losses` games against the same opponent.
+
+    Returns
+    ----------
+    (float, float, float)
+        The estimated difference, and the lower and upper bounds of its
+        confidence interval. The interval is the Wilson score interval with
+        normal quantile `z` (95% by default), which stays meaningful when a
+        player won or lost every game.
+    """
+    games = wins + losses
+    if games == 0:
+        return 0., float("-inf"), float("inf")
+    score = wins / games
+    z2 = z * z / games
+    center = (score + z2 / 2.) / (1. + z2)
+    margin = z * math.sqrt(score * (1. - score) / games + z2 / (4. * games)) / (1. + z2)
+    return (elo_difference(score), elo_difference(center - margin),
+            elo_difference(center + margin))
+
+
+def sprt_llr(wins, losses, elo0, elo1):
+    """
+    Return the log-likelihood ratio of the hypothesis that the Elo
+    difference is `elo1` against the hypothesis that it is `elo0`, given the
+    games won and lost. Isolation games cannot be drawn, so each game is a
+    Bernoulli trial and the ratio is exact.
+    """
+    s0, s1 = expected_score(elo0), expected_score(elo1)
+    return wins * math.log(s1 / s0) + losses * math.log((1. - s1) / (1. - s0))
 
-def play_match(player1, player2):
+
+def sprt_decision(wins, losses, sprt):
+    """
+    Apply a sequential probability ratio test to the games won and lost.
+
+    Returns
+    ----------
+    str or None
+        "H1" if the Elo difference is resolved in favour of `sprt.elo1`, "H0"
+        if it is resolved in favour of `sprt.elo0`, and None if more games
+        are needed.
+    """
+    llr = sprt_llr(wins, losses, sprt.elo0, sprt.elo1)
+    if llr >= math.log((1. - sprt.beta) / sprt.alpha):
+        return "H1"
+    if llr <= math.log(sprt.beta / (1. - sprt.alpha)):
+        return "H0"
+    return None
+
+
+def format_elo(wins, losses):
+    """ Format the Elo difference estimated by `elo_interval()` as text. """
+    return "{:+.0f} Elo [{:+.0f}, {:+.0f}]".format(*elo_interval(wins, losses))
+
+
+def play_match(player1, player2, seed=None, clock=CLOCK, opening=None):
     """
     Play a "fair" set of matches between two agents by playing two games
     between the players, forcing each agent to play from randomly selected
     positions. This should control for differences in outcome resulting from
     advantage due to starting position on the board.
+
+    The opening moves are the pair of moves `opening` if it is given, or are
+    drawn from a generator seeded with `seed`, or from the global random
+    generator if no seed is given. The time limit of each move is measured on
+    the specified `clock` (see `Board.play()`).
+
+    Returns a `MatchResult`.
     """
+    rng = random if seed is None else random.Random(seed)
     num_wins = {player1: 0, player2: 0}
+    move_times = {player1: [], player2: []}
     num_timeouts = {player1: 0, player2: 0}
     num_invalid_moves = {player1: 0, player2: 0}
     games = [Board(player1, player2), Board(player2, player1)]
-
-    # initialize both games with a random move and response
-    for _ in range(2):
-        move = random.choice(games[0].get_legal_moves())
+    opening_moves = []
+    records = []
+
+    # initialize both games with the same move and response
+    for ply in range(2):
+        if opening is None:
+            move = rng.choice(games[0].get_legal_moves())
+        else:
+            move = opening[ply]
         games[0].apply_move(move)
         games[1].apply_move(move)
+        opening_moves.append(move)
 
     # play both games and tally the results
     for game in games:
-        winner, _, termination = game.play(time_limit=TIME_LIMIT)
+        first_player = game.active_player
+        times = []
+        nodes = []
+        winner, _, termination = game.play(time_limit=TIME_LIMIT, clock=clock,
+                                           move_times=times, move_nodes=nodes)
+        move_times[first_player].extend(times[0::2])
+        move_times[game.get_opponent(first_player)].extend(times[1::2])
+        records.append(GameRecord(1 if first_player == player1 else 2,
+                                  opening_moves, 1 if winner == player1 else 2,
+                                  termination, times, nodes))
 
         if player1 == winner:
             num_wins[player1] += 1
@@ -99,50 +236,285 @@ def play_match(player1, player2):
     if sum(num_timeouts.values()) != 0:
         warnings.warn(TIMEOUT_WARNING)
 
-    return num_wins[player1], num_wins[player2]
+    return MatchResult(num_wins[player1], num_wins[player2],
+                       move_times[player1], move_times[player2], records)
+
+
+def log_entries(agent, opponent, number, seed, names, result):
+    """
+    Return the entries of the results log describing the games of a match.
+
+    Parameters
+    ----------
+    agent, opponent : str
+        The names of the agent evaluated in the round and of its opponent.
+
+    number : int
+        The index of the match among the matches between the two agents.
+
+    seed : int
+        The seed the opening moves of the match were drawn with.
 
+    names : (str, str)
+        The names of the first and second player of the match.
 
-def play_round(agents, num_matches):
+    result : MatchResult
+        The outcome of the match.
+    """
+    return [{"agent": agent, "opponent": opponent, "match": number,
+             "game": index, "seed": seed,
+             "player_1": names[game.first - 1], "player_2": names[2 - game.first],
+             "opening": game.opening, "winner": names[game.winner - 1],
+             "termination": game.termination, "move_times": game.move_times,
+             "nodes": game.nodes}
+            for index, game in enumerate(result.games)]
+
+
+def match_from_log(entries, names):
+    """
+    Rebuild the `MatchResult` of a match from its entries in the results
+    log (see `log_entries()`), where `names` are the names of the first and
+    second player of the match.
+    """
+    wins = [0, 0]
+    move_times = [[], []]
+    games = []
+    for entry in entries:
+        first = names.index(entry["player_1"]) + 1
+        winner = names.index(entry["winner"]) + 1
+        times = [tuple(t) for t in entry["move_times"]]
+        wins[winner - 1] += 1
+        move_times[first - 1].extend(times[0::2])
+        move_times[2 - first].extend(times[1::2])
+        games.append(GameRecord(first, [tuple(m) for m in entry["opening"]],
+                                winner, entry["termination"], times,
+                                entry["nodes"]))
+    return MatchResult(wins[0], wins[1], move_times[0], move_times[1], games)
+
+
+def load_log(path):
+    """
+    Read the results log written by `play_round()` during an earlier run.
+
+    Lines that cannot be parsed (e.g., the last line of a run that was
+    interrupted while writing it) are ignored, and so are matches that were
+    not played to the end.
+
+    Returns
+    ----------
+    dict
+        Map (agent name, opponent name, match index) to the list of entries
+        of the games of each completed match, in order.
+    """
+    matches = {}
+    with open(path) as log_file:
+        for line in log_file:
+            try:
+                entry = json.loads(line)
+                key = (entry["agent"], entry["opponent"], entry["match"])
+                matches.setdefault(key, {})[entry["game"]] = entry
+            except (ValueError, KeyError, TypeError):
+                continue
+    return {key: [games[0], games[1]] for key, games in matches.items()
+            if 0 in games and 1 in games}
+
+
+def play_round(agents, num_matches, workers=1, clock=CLOCK, sprt=None,
+               log=None, completed=None, openings=None):
     """
     Play one round (i.e., a single match between each pair of opponents)
+
+    With more than one worker, the matches are played concurrently in a pool
+    of processes; each process plays with its own copy of the agents, so the
+    results are the same as playing the matches one after another.
+
+    If an `SPRT` is given, `num_matches` is the maximum number of matches in
+    each seat order, and a pairing stops as soon as the test resolves the
+    Elo difference between the two agents. The seat orders alternate so that
+    a pairing stopped early has played both of them equally often.
+
+    If a list of `openings` is given, the matches of each pairing play them
+    in order (starting over after the last one) instead of random openings;
+    both games of a match start from the same opening.
+
+    If a `log` file is given, one JSON line describing each game (see
+    `log_entries()`) is written and flushed as soon as its match ends. The
+    matches found in `completed` (see `load_log()`) are not played again:
+    their logged results are counted instead. Matches are identified by the
+    names of the agents, which must be unique.
     """
     agent_1 = agents[-1]
     wins = 0.
     total = 0.
+    move_times = []
+    completed = completed or {}
 
     print("\nPlaying Matches:")
     print("----------")
 
-    for idx, agent_2 in enumerate(agents[:-1]):
-
-        counts = {agent_1.player: 0., agent_2.player: 0.}
-        names = [agent_1.name, agent_2.name]
-        print("  Match {}: {!s:^11} vs {!s:^11}".format(idx + 1, *names), end=' ')
-
-        # Each player takes a turn going first
-        for p1, p2 in itertools.permutations((agent_1.player, agent_2.player)):
-            for _ in range(num_matches):
-                score_1, score_2 = play_match(p1, p2)
-                counts[p1] += score_1
-                counts[p2] += score_2
-                total += score_1 + score_2
-
-        wins += counts[agent_1.player]
-
-        print("\tResult: {} to {}".format(int(counts[agent_1.player]),
-                                          int(counts[agent_2.player])))
+    # Each player takes a turn going first
+    pairings = [[[p1, p2, None if openings else random.getrandbits(32), None]
+                 for _ in range(num_matches)
+                 for p1, p2 in itertools.permutations((agent_1.player, agent_2.player))]
+                for agent_2 in agents[:-1]]
+
+    def opening(number):
+        return openings[number % len(openings)] if openings else None
+
+    executor = None
+    if workers > 1:
+        # reseed the global generator of every worker so that agents using
+        # it (e.g., RandomPlayer) do not replay the same moves in each process
+        executor = ProcessPoolExecutor(workers, initializer=random.seed)
+
+    try:
+        # the last item of each match is None if it must be played here, its
+        # pending result if it is played by the process pool, or its result
+        # if it was read from the log of an earlier run
+        for agent_2, matches in zip(agents[:-1], pairings):
+            names = {agent_1.player: agent_1.name, agent_2.player: agent_2.name}
+            for number, match in enumerate(matches):
+                p1, p2, seed, _ = match
+                entries = completed.get((agent_1.name, agent_2.name, number))
+                if entries is not None:
+                    match[2] = entries[0]["seed"]
+                    match[3] = match_from_log(entries, (names[p1], names[p2]))
+                elif executor is not None:
+                    match[3] = executor.submit(play_match, p1, p2, seed, clock,
+                                               opening(number))
+
+        for idx, agent_2 in enumerate(agents[:-1]):
+
+            counts = {agent_1.player: 0., agent_2.player: 0.}
+            names = {agent_1.player: agent_1.name, agent_2.player: agent_2.name}
+            print("  Match {}: {!s:^11} vs {!s:^11}".format(idx + 1, agent_1.name,
+                                                           agent_2.name),
+                  end=' ', flush=True)
+
+            decision = None
+            for number, (p1, p2, seed, match) in enumerate(pairings[idx]):
+                if match is None:
+                    result = play_match(p1, p2, seed, clock, opening(number))
+                elif isinstance(match, Future):
+                    result = match.result()
+                else:
+                    result = match
+                if log is not None and not isinstance(match, MatchResult):
+                    for entry in log_entries(agent_1.name, agent_2.name, number,
+                                             seed, (names[p1], names[p2]), result):
+                        log.write(json.dumps(entry) + "\n")
+                    log.flush()
+
+                counts[p1] += result.wins_1
+                counts[p2] += result.wins_2
+                total += result.wins_1 + result.wins_2
+                move_times.extend(result.move_times_1 if p1 == agent_1.player
+                                  else result.move_times_2)
+
+                if sprt is not None and number % 2 == 1:
+                    decision = sprt_decision(counts[agent_1.player],
+                                             counts[agent_2.player], sprt)
+                    if decision is not None:
+                        break
+
+            for _, _, _, match in pairings[idx]:
+                if isinstance(match, Future):
+                    match.cancel()
+
+            wins += counts[agent_1.player]
+
+            print("\tResult: {} to {}\t{}".format(
+                int(counts[agent_1.player]), int(counts[agent_2.player]),
+                format_elo(counts[agent_1.player], counts[agent_2.player])),
+                end='')
+            if decision is not None:
+                print("\t(SPRT: {} after {} games)".format(
+                    decision, int(sum(counts.values()))), end='')
+            print("")
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    if move_times:
+        print("\n  Mean move time of {}: {:.1f} ms wall-clock, {:.1f} ms CPU".format(
+            agent_1.name, *[sum(t) / len(move_times) for t in zip(*move_times)]))
+
+    print("  Rating of {} against the field: {}".format(
+        agent_1.name, format_elo(wins, total - wins)))
 
     return 100. * wins / total
 
 
-def main():
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes playing matches in parallel "
+                             "(0 uses every CPU; default: 1)")
+    parser.add_argument("--clock", choices=["wall", "thread", "process"],
+                        default=CLOCK,
+                        help="clock measuring the time limit of each move: "
+                             "wall-clock time, or CPU time of the thread or "
+                             "process playing the game (default: %(default)s)")
+    parser.add_argument("--matches", type=int, default=NUM_MATCHES,
+                        help="number of matches against each opponent, or "
+                             "the maximum number with --sprt "
+                             "(default: %(default)s)")
+    parser.add_argument("--sprt", type=float, nargs=2, metavar=("ELO0", "ELO1"),
+                        help="stop each pairing early once a sequential "
+                             "probability ratio test decides whether the Elo "
+                             "difference is ELO0 or ELO1 (e.g., -50 50)")
+    parser.add_argument("--alpha", type=float, default=0.05,
+                        help="false positive rate of the SPRT (default: %(default)s)")
+    parser.add_argument("--beta", type=float, default=0.05,
+                        help="false negative rate of the SPRT (default: %(default)s)")
+    parser.add_argument("--log", metavar="PATH",
+                        help="write the course of every game to PATH as JSON "
+                             "lines, as soon as each match ends")
+    parser.add_argument("--resume", action="store_true",
+                        help="keep the games already logged in the --log file "
+                             "and only play the matches missing from it")
+    parser.add_argument("--openings", metavar="PATH",
+                        help="opening suite played by the matches, in order "
+                             "(default: the suite of the 7x7 board, see "
+                             "openings.py)")
+    parser.add_argument("--random-openings", action="store_true",
+                        help="start every match from random opening moves "
+                             "instead of an opening suite")
+    args = parser.parse_args(argv)
+    workers = args.workers or os.cpu_count()
+    sprt = None
+    if args.sprt is not None:
+        sprt = SPRT(args.sprt[0], args.sprt[1], args.alpha, args.beta)
+    if args.resume and args.log is None:
+        parser.error("--resume requires --log")
+
+    openings = None
+    if not args.random_openings:
+        openings = read_suite(args.openings) if args.openings else load_suite()
+
+    completed = {}
+    log = None
+    if args.log is not None:
+        if args.resume and os.path.exists(args.log):
+            completed = load_log(args.log)
+            log = open(args.log, "a+")
+            # do not append to the last line if the earlier run was
+            # interrupted while writing it
+            if log.tell() > 0:
+                log.seek(log.tell() - 1)
+                if log.read(1) != "\n":
+                    log.write("\n")
+        else:
+            log = open(args.log, "w")
 
     HEURISTICS = [("Null", null_score),
                   ("Open", open_move_score),
                   ("Improved", improved_score)]
     AB_ARGS = {"search_depth": 5, "method": 'alphabeta', "iterative": False}
     MM_ARGS = {"search_depth": 3, "method": 'minimax', "iterative": False}
-    CUSTOM_ARGS = {"method": 'alphabeta', 'iterative': True}
+    CUSTOM_ARGS = {"method": 'alphabeta', 'iterative': True, 'inplace': True,
+                   'tt_mb': 16, 'ordering': True}
 
     # Create a collection of CPU agents using fixed-depth minimax or alpha beta
     # search, or random selection.  The agent names encode the search method
@@ -171,12 +543,16 @@ def main():
         print("*************************")
 
         agents = random_agents + mm_agents + ab_agents + [agentUT]
-        win_ratio = play_round(agents, NUM_MATCHES)
+        win_ratio = play_round(agents, args.matches, workers, args.clock, sprt,
+                               log, completed, openings)
 
         print("\n\nResults:")
         print("----------")
         print("{!s:<15}{:>10.2f}%".format(agentUT.name, win_ratio))
 
+    if log is not None:
+        log.close()
+
 
 if __name__ == "__main__":
     main()
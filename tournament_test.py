@@ -0,0 +1,172 @@
+"""
+This file contains test cases for the tournament runner in tournament.py.
+The agents used here are fast and deterministic so that the tests only
+depend on the seeds chosen for the opening moves.
+"""
+import io
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from contextlib import redirect_stdout
+
+import openings
+import tournament
+
+from isolation import board_symmetries
+
+from sample_players import GreedyPlayer
+from sample_players import RandomPlayer
+from sample_players import improved_score
+from sample_players import open_move_score
+
+
+def greedy_agents():
+    return [tournament.Agent(GreedyPlayer(open_move_score), "Greedy_Open"),
+            tournament.Agent(GreedyPlayer(improved_score), "Greedy_Improved")]
+
+
+class PlayRoundTest(unittest.TestCase):
+
+    def test_parallel_round_matches_serial_round(self):
+        """ Playing the matches in a process pool gives the same results """
+        random.seed(0)
+        serial = tournament.play_round(greedy_agents(), 3)
+        random.seed(0)
+        parallel = tournament.play_round(greedy_agents(), 3, workers=2)
+        self.assertEqual(serial, parallel)
+
+    def test_sprt_stops_one_sided_pairing_early(self):
+        """ A pairing stops once the SPRT resolves the Elo difference """
+        agents = [tournament.Agent(RandomPlayer(), "Random"),
+                  tournament.Agent(GreedyPlayer(improved_score), "Greedy")]
+        sprt = tournament.SPRT(-200, 200, 0.05, 0.05)
+        output = io.StringIO()
+        random.seed(0)
+        with redirect_stdout(output):
+            win_ratio = tournament.play_round(agents, 50, sprt=sprt)
+        self.assertGreater(win_ratio, 50.)
+        self.assertIn("SPRT: H1", output.getvalue())
+
+    def test_parallel_sprt_round_matches_serial_round(self):
+        """ Early stopping gives the same results in a process pool """
+        sprt = tournament.SPRT(-100, 100, 0.1, 0.1)
+        random.seed(1)
+        serial = tournament.play_round(greedy_agents(), 10, sprt=sprt)
+        random.seed(1)
+        parallel = tournament.play_round(greedy_agents(), 10, workers=2, sprt=sprt)
+        self.assertEqual(serial, parallel)
+
+
+class EloTest(unittest.TestCase):
+
+    def test_elo_difference_inverts_expected_score(self):
+        for elo in (-400, -35, 0, 120):
+            score = tournament.expected_score(elo)
+            self.assertAlmostEqual(tournament.elo_difference(score), elo)
+        self.assertEqual(tournament.elo_difference(1.), float("inf"))
+        self.assertEqual(tournament.elo_difference(0.), float("-inf"))
+
+    def test_elo_interval_contains_estimate_and_shrinks(self):
+        elo, lower, upper = tournament.elo_interval(60, 40)
+        self.assertLess(lower, elo)
+        self.assertLess(elo, upper)
+        _, wide_lower, wide_upper = tournament.elo_interval(6, 4)
+        self.assertLess(upper - lower, wide_upper - wide_lower)
+        # a clean sweep has an infinite estimate but a finite lower bound
+        elo, lower, upper = tournament.elo_interval(4, 0)
+        self.assertEqual(elo, float("inf"))
+        self.assertGreater(lower, 0.)
+
+    def test_sprt_decision(self):
+        sprt = tournament.SPRT(0, 100, 0.05, 0.05)
+        self.assertIsNone(tournament.sprt_decision(3, 2, sprt))
+        self.assertEqual(tournament.sprt_decision(30, 2, sprt), "H1")
+        self.assertEqual(tournament.sprt_decision(10, 30, sprt), "H0")
+
+
+class ResultsLogTest(unittest.TestCase):
+
+    def play_logged_round(self, num_matches, completed=None):
+        log = io.StringIO()
+        with redirect_stdout(io.StringIO()):
+            win_ratio = tournament.play_round(greedy_agents(), num_matches,
+                                              log=log, completed=completed)
+        return win_ratio, log.getvalue()
+
+    def test_log_has_one_entry_per_game(self):
+        random.seed(2)
+        _, text = self.play_logged_round(2)
+        entries = [json.loads(line) for line in text.splitlines()]
+        # 2 matches in each seat order, 2 games per match
+        self.assertEqual(len(entries), 8)
+        for entry in entries:
+            self.assertEqual(entry["agent"], "Greedy_Improved")
+            self.assertEqual(entry["opponent"], "Greedy_Open")
+            self.assertIn(entry["winner"], (entry["player_1"], entry["player_2"]))
+            self.assertEqual(len(entry["opening"]), 2)
+            self.assertEqual(len(entry["move_times"]), len(entry["nodes"]))
+
+    def test_resume_skips_logged_matches(self):
+        random.seed(3)
+        win_ratio, text = self.play_logged_round(3)
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "results.jsonl")
+            with open(path, "w") as log_file:
+                # drop the last game as if the run had been interrupted
+                log_file.writelines(text.splitlines(True)[:-1])
+            completed = tournament.load_log(path)
+        self.assertEqual(len(completed), 5)
+
+        random.seed(3)
+        resumed_ratio, resumed_text = self.play_logged_round(3, completed)
+        self.assertEqual(resumed_ratio, win_ratio)
+        # only the interrupted match is played again
+        self.assertEqual(len(resumed_text.splitlines()), 2)
+        for line, resumed_line in zip(text.splitlines()[-2:], resumed_text.splitlines()):
+            entry, resumed = json.loads(line), json.loads(resumed_line)
+            for field in ("match", "game", "seed", "opening", "winner"):
+                self.assertEqual(resumed[field], entry[field])
+
+
+class OpeningSuiteTest(unittest.TestCase):
+
+    def test_suite_has_one_opening_per_symmetry_class(self):
+        suite = openings.opening_suite(7, 7)
+        self.assertEqual(len(suite), 315)
+        symmetries = board_symmetries(7, 7)
+        classes = set()
+        for (r1, c1), (r2, c2) in suite:
+            self.assertNotEqual((r1, c1), (r2, c2))
+            first, second = r1 * 7 + c1, r2 * 7 + c2
+            classes.add(min((p[first], p[second]) for p in symmetries))
+        self.assertEqual(len(classes), len(suite))
+
+    def test_stored_suite_matches_generated_suite(self):
+        self.assertEqual(openings.load_suite(7, 7), openings.opening_suite(7, 7))
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "5x5.txt")
+            suite = openings.opening_suite(5, 5)
+            openings.write_suite(path, suite)
+            self.assertEqual(openings.read_suite(path), suite)
+
+    def test_rounds_with_suite_are_repeatable(self):
+        """ Matches follow the suite in order whatever the random state """
+        suite = openings.load_suite()
+        results = []
+        for seed in (4, 5):
+            random.seed(seed)
+            log = io.StringIO()
+            with redirect_stdout(io.StringIO()):
+                tournament.play_round(greedy_agents(), 2, log=log, openings=suite)
+            entries = [json.loads(line) for line in log.getvalue().splitlines()]
+            results.append([(e["opening"], e["winner"]) for e in entries])
+        self.assertEqual(results[0], results[1])
+        self.assertEqual([tuple(map(tuple, opening)) for opening, _ in results[0][::2]],
+                         suite[:4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,338 @@
+"""This file contains the transposition table used by `CustomPlayer` to reuse
+the results of alpha-beta search between positions reached through different
+move orders and between the iterations of iterative deepening.
+
+Positions are identified by the incremental Zobrist key `Board.hash`.
+
+`SharedTranspositionTable` offers the same interface on top of a block of
+shared memory, so that the worker processes of a parallel search can read and
+write the same table concurrently.
+"""
+import multiprocessing
+import struct
+import sys
+
+from multiprocessing import resource_tracker
+from multiprocessing import shared_memory
+
+EXACT = 0  # the stored value is the exact minimax value of the position
+LOWER = 1  # the search failed high; the true value is >= the stored value
+UPPER = 2  # the search failed low; the true value is <= the stored value
+
+# Approximate memory footprint of one stored entry in CPython: the entry
+# tuple, its 64-bit key and float value, plus the table slot referencing it.
+ENTRY_BYTES = 160
+
+# Entries are plain tuples (key, depth, flag, value, move, age) rather than
+# named tuples: the garbage collector stops tracking exact tuples of atomic
+# values, so a full table does not slow down (and delay) every collection.
+KEY, DEPTH, FLAG, VALUE, MOVE, AGE = range(6)
+
+
+def table_slots(size_mb, slot_bytes, reserved=0):
+    """Return the number of slots of a table: the largest power of two
+    whose slots fit in `size_mb` megabytes besides `reserved` bytes, and at
+    least the two slots of one bucket."""
+    budget = (int(size_mb * (1 << 20)) - reserved) // slot_bytes
+    slots = 2
+    while slots * 2 <= budget:
+        slots *= 2
+    return slots
+
+
+class TranspositionTable(object):
+    """Fixed-size hash table of search results with a two-tier replacement
+    scheme.
+
+    Every bucket has two slots. The first slot is depth-preferred: it keeps
+    the entry searched to the greatest depth, unless that entry was stored
+    during an earlier search (see `new_search()`). The second slot is
+    always-replace: it receives every entry rejected by the first slot, so
+    recent results are never lost entirely.
+
+    Parameters
+    ----------
+    size_mb : float (optional)
+        Approximate upper bound on the memory used by the table, in
+        megabytes. The number of slots (two per bucket) is the largest power
+        of two that fits in the budget, so the table fills more than half of
+        it.
+    """
+    def __init__(self, size_mb=16):
+        self.table = [None] * table_slots(size_mb, ENTRY_BYTES)
+        self.mask = len(self.table) // 2 - 1
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        """Remove every entry from the table."""
+        self.table = [None] * len(self.table)
+        self.age = 0
+
+    def new_search(self):
+        """Mark the entries stored so far as belonging to an earlier search
+        so that they can be evicted from the depth-preferred slots.
+        """
+        self.age += 1
+
+    def probe(self, key):
+        """Look up a position in the table.
+
+        Parameters
+        ----------
+        key : int
+            The Zobrist key of the position
+
+        Returns
+        -------
+        tuple or None
+            The stored entry (key, depth, flag, value, move, age) for the
+            position, or None if it is not present
+        """
+        self.probes += 1
+        index = (key & self.mask) << 1
+        table = self.table
+        entry = table[index]
+        if entry is None or entry[KEY] != key:
+            entry = table[index + 1]
+            if entry is None or entry[KEY] != key:
+                return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, flag, value, move):
+        """Record the result of searching a position.
+
+        Parameters
+        ----------
+        key : int
+            The Zobrist key of the position
+
+        depth : int
+            The remaining search depth used to compute the value
+
+        flag : {EXACT, LOWER, UPPER}
+            Whether the value is exact, a lower bound or an upper bound
+
+        value : float
+            The value of the position returned by the search
+
+        move : (int, int)
+            The best move found for the position; None if there was none
+        """
+        index = (key & self.mask) << 1
+        table = self.table
+        deep = table[index]
+        entry = (key, depth, flag, value, move, self.age)
+        if deep is None or deep[KEY] == key or deep[AGE] != self.age or depth >= deep[DEPTH]:
+            table[index] = entry
+        else:
+            table[index + 1] = entry
+
+
+# A shared table record is three 64-bit words: a checksum, the packed data
+# (see `pack_data()`) and the bits of the value. The checksum is the XOR of
+# the key and the two other words, so a record torn by concurrent writes
+# from two processes no longer matches its key and is ignored, without any
+# lock.
+RECORD = struct.Struct("<QQQ")
+FLOAT = struct.Struct("<d")
+BITS = struct.Struct("<Q")
+# The age of the current search, stored after the records so that every
+# process using the table agrees on which entries are stale
+GENERATION = struct.Struct("<Q")
+
+# Bit set in the data word of every stored record; empty records are zero
+OCCUPIED = 1 << 63
+
+
+def pack_data(depth, flag, move, age):
+    """Pack the depth (16 bits), flag (8 bits), age (8 bits) and move (8 bits
+    per coordinate, offset by one so that 0 stands for no move) of a record
+    into a 64-bit word.
+    """
+    data = OCCUPIED | depth | flag << 16 | (age & 0xFF) << 24
+    if move is not None:
+        data |= (move[0] + 1) << 40 | (move[1] + 1) << 32
+    return data
+
+
+def unpack_data(data):
+    """Return the (depth, flag, move, age) packed by `pack_data()`."""
+    move = None
+    if data >> 32 & 0xFFFF:
+        move = ((data >> 40 & 0xFF) - 1, (data >> 32 & 0xFF) - 1)
+    return data & 0xFFFF, data >> 16 & 0xFF, move, data >> 24 & 0xFF
+
+
+# The names of the shared memory blocks created by this process
+_CREATED_BLOCKS = set()
+
+
+def started_by_multiprocessing():
+    """Return whether this process was started by multiprocessing, and so
+    shares the resource tracker of the process that started it."""
+    # the arguments of a process started with the "spawn" method are
+    # unpickled before its parent process is known
+    return (multiprocessing.parent_process() is not None
+            or getattr(multiprocessing.current_process(), "_inheriting", False))
+
+
+def attach_table(name, buckets):
+    """Open a `SharedTranspositionTable` created by another process."""
+    return SharedTranspositionTable(name=name, buckets=buckets)
+
+
+class SharedTranspositionTable(object):
+    """Transposition table stored in shared memory, with the same interface
+    and replacement scheme as `TranspositionTable`.
+
+    Records have a fixed size and are read and written without locks by any
+    number of processes (see `RECORD`). Pickling the table, e.g. to pass it
+    to a process started with the "spawn" method, shares the same memory
+    rather than copying the entries. The process that created the table
+    must `close()` it to release the memory.
+
+    Parameters
+    ----------
+    size_mb : float (optional)
+        Approximate upper bound on the shared memory used by the table, in
+        megabytes.
+
+    name : str (optional)
+        The name of the shared memory block of an existing table to open;
+        a new table is created if None.
+
+    buckets : int (optional)
+        The number of buckets of the existing table to open.
+    """
+    def __init__(self, size_mb=16, name=None, buckets=None):
+        if name is None:
+            buckets = table_slots(size_mb, RECORD.size, GENERATION.size) // 2
+            self.memory = shared_memory.SharedMemory(
+                create=True, size=2 * buckets * RECORD.size + GENERATION.size)
+            _CREATED_BLOCKS.add(self.memory._name)
+            self.owner = True
+        else:
+            # the creator of the block is responsible for releasing it
+            if sys.version_info >= (3, 13):
+                self.memory = shared_memory.SharedMemory(name=name, track=False)
+            else:
+                # opening the block registers it with the resource tracker,
+                # which releases it when the tracker exits. The creator and
+                # the processes it started with multiprocessing report to the
+                # same tracker, where the block is registered already, so
+                # only a process with a tracker of its own unregisters it
+                self.memory = shared_memory.SharedMemory(name=name)
+                if (not started_by_multiprocessing()
+                        and self.memory._name not in _CREATED_BLOCKS):
+                    resource_tracker.unregister(self.memory._name, "shared_memory")
+            self.owner = False
+        self.buffer = self.memory.buf
+        self.mask = buckets - 1
+        self.generation = 2 * buckets * RECORD.size
+        self.follower = False
+        self.probes = 0
+        self.hits = 0
+
+    def __reduce__(self):
+        return attach_table, (self.memory.name, self.mask + 1)
+
+    def close(self):
+        """Detach from the shared memory, and release it if this process
+        created the table.
+        """
+        if self.buffer is None:
+            return
+        self.buffer.release()
+        self.buffer = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    @property
+    def age(self):
+        """The age of the current search, read from the shared memory."""
+        return GENERATION.unpack_from(self.buffer, self.generation)[0]
+
+    def clear(self):
+        """Remove every entry from the table."""
+        self.buffer[:] = bytes(len(self.buffer))
+
+    def new_search(self):
+        """Mark the entries stored so far as belonging to an earlier search
+        so that they can be evicted from the depth-preferred slots.
+
+        The age is shared by every process using the table; a `follower`
+        process (e.g., a worker of a parallel search) leaves it to the
+        process that starts the searches, so that the entries stored by
+        all workers during one search have the same age.
+        """
+        if not self.follower:
+            GENERATION.pack_into(self.buffer, self.generation, self.age + 1)
+
+    def read(self, slot, key):
+        """Return the entry of a slot if it holds the key, else None."""
+        check, data, bits = RECORD.unpack_from(self.buffer, slot * RECORD.size)
+        if not data or check ^ data ^ bits != key:
+            return None
+        depth, flag, move, age = unpack_data(data)
+        return (key, depth, flag, FLOAT.unpack(BITS.pack(bits))[0], move, age)
+
+    def probe(self, key):
+        """Look up a position in the table.
+
+        Parameters
+        ----------
+        key : int
+            The Zobrist key of the position
+
+        Returns
+        -------
+        tuple or None
+            The stored entry (key, depth, flag, value, move, age) for the
+            position, or None if it is not present
+        """
+        self.probes += 1
+        index = (key & self.mask) << 1
+        entry = self.read(index, key)
+        if entry is None:
+            entry = self.read(index + 1, key)
+            if entry is None:
+                return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, flag, value, move):
+        """Record the result of searching a position.
+
+        Parameters
+        ----------
+        key : int
+            The Zobrist key of the position
+
+        depth : int
+            The remaining search depth used to compute the value
+
+        flag : {EXACT, LOWER, UPPER}
+            Whether the value is exact, a lower bound or an upper bound
+
+        value : float
+            The value of the position returned by the search
+
+        move : (int, int)
+            The best move found for the position; None if there was none
+        """
+        index = (key & self.mask) << 1
+        age = self.age
+        check, deep, bits = RECORD.unpack_from(self.buffer, index * RECORD.size)
+        if deep and check ^ deep ^ bits != key:
+            # the depth-preferred slot holds another position
+            deep_depth, _, _, deep_age = unpack_data(deep)
+            if deep_age == age & 0xFF and depth < deep_depth:
+                index += 1
+        data = pack_data(depth, flag, move, age)
+        bits = BITS.unpack(FLOAT.pack(value))[0]
+        RECORD.pack_into(self.buffer, index * RECORD.size,
+                         key ^ data ^ bits, data, bits)